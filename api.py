@@ -0,0 +1,163 @@
+"""Endpoint logic shared by the Flask (server.py) and ASGI (asgi.py) apps.
+
+Handlers take the session registry and two accessors for the request,
+``arg(name, default=None, type=str)`` for query arguments and ``header``
+with the same signature, and return ``(compact, payload)``: the payload
+goes out in the compact protocol when ``compact`` is true and as JSON
+otherwise. The servers only parse requests, wait and write responses,
+as waiting is what differs between threads and asyncio.
+
+Events are shared with the session history, so keys the transport adds
+(``runId``) always go on a copy.
+"""
+
+import json
+import time
+
+from engine import Game
+import metrics
+import protocol
+
+MAX_BATCH = 200
+MAX_WAIT = 30.0
+
+
+def wants_compact(arg, header):
+    return protocol.wants_compact(arg('format'), header('Accept'))
+
+
+def start(sessions, arg, header):
+    session = sessions.create(Game(seed=arg('seed', type=int)))
+    compact = wants_compact(arg, header)
+    with session.lock:
+        ev = session.pull()[0]
+        if compact:
+            events = [session.encode(ev)]
+    if compact:
+        return True, {'runId': session.run_id, 'seq': session.seq,
+                      'seed': session.game.seed, 'v': protocol.VERSION,
+                      'events': events}
+    return False, dict(ev, runId=session.run_id, seq=session.seq, seed=session.game.seed)
+
+
+class Poll:
+    """A ``/next`` request: sleep for ``delay`` seconds, then :meth:`reply`.
+
+    Without ``batch``, ``until``, ``after`` or the compact format it is the
+    original one-event call. Otherwise it is a long poll: with ``wait`` the
+    request is held until the client has nearly played out the previous
+    batch at its playback ``speed``.
+    """
+
+    def __init__(self, sessions, arg, header):
+        self.session = sessions.get(arg('runId'))
+        self.compact = wants_compact(arg, header)
+        self.after = arg('after', type=int)
+        batch = arg('batch', type=int)
+        until = arg('until')
+        self.single = batch is None and until is None and self.after is None and not self.compact
+        self.delay = 0.0
+        if self.session is None or self.single:
+            return
+        self.limit = min(batch or MAX_BATCH, MAX_BATCH)
+        self.until_round = until == 'round'
+        wait = min(arg('wait', 0.0, type=float), MAX_WAIT)
+        self.speed = max(arg('speed', 1.0, type=float), 0.1)
+        delay = self.session.ready_at - 1 / self.speed - time.monotonic()
+        if wait and delay > 0:
+            self.delay = min(delay, wait)
+
+    def reply(self):
+        session = self.session
+        if session is None:
+            return False, None
+        if self.single:
+            with session.lock:
+                events = session.pull()
+            return False, dict(events[0], runId=session.run_id) if events else None
+        with session.lock:
+            # without ``after`` the client just wants whatever comes next;
+            # with it the request can be repeated and returns the same events
+            after = session.seq if self.after is None else self.after
+            if session.missed(after):
+                return self.compact, {'runId': session.run_id, 'resync': True, 'seq': session.seq}
+            items = session.read(after, self.limit, until_round=self.until_round)
+            session.ready_at = time.monotonic() + len(items) / self.speed
+            seq = items[-1][0] if items else after
+            done = session.done and seq >= session.seq
+            events = [ev for _, ev in items]
+            if self.compact:
+                events = [session.encode(ev) for ev in events]
+        return self.compact, {'runId': session.run_id, 'events': events, 'seq': seq, 'done': done}
+
+
+class Stream:
+    """A ``/stream`` request for server-sent events.
+
+    When ``found`` is false the server answers 204, which tells
+    EventSource not to reconnect. Otherwise it sends :meth:`chunks`,
+    pausing for ``pause`` seconds wherever the generator yields None.
+    """
+
+    def __init__(self, sessions, arg, header):
+        self.session = session = sessions.get(arg('runId'))
+        self.pause = 1 / max(arg('speed', 1.0, type=float), 0.1)
+        after = header('Last-Event-ID', type=int)
+        if after is None:
+            after = arg('after', 0, type=int)
+        self.after = after
+        self.compact = wants_compact(arg, header)
+        self.found = session is not None and not (session.done and after >= session.seq)
+
+    def chunks(self):
+        session = self.session
+        last = self.after
+        with session.lock:
+            missed, seq = session.missed(last), session.seq
+        if missed:
+            # the client fell too far behind: it has to reload /state
+            yield f'event: resync\ndata: {json.dumps({"seq": seq})}\n\n'
+            return
+        while True:
+            with session.lock:
+                items = session.read(last)
+                if self.compact:
+                    items = [(seq, session.encode(ev)) for seq, ev in items]
+            if not items:
+                return
+            for seq, ev in items:
+                if self.compact:
+                    data = protocol.dumps(ev)
+                else:
+                    data = json.dumps(dict(ev, runId=session.run_id))
+                yield f'id: {seq}\ndata: {data}\n\n'
+                last = seq
+            yield None
+
+
+def state(sessions, arg):
+    session = sessions.get(arg('runId'))
+    if not session:
+        return None
+    with session.lock:
+        return dict(session.snapshot(), runId=session.run_id)
+
+
+def skip(sessions, arg):
+    """Play the rest of a run at once and return its outcome.
+
+    The remaining events still go through the session so that ``/state``,
+    ``/next`` and ``/stream`` stay consistent; clients that skipped should
+    reload ``/state`` rather than replay them.
+    """
+    session = sessions.get(arg('runId'))
+    if not session:
+        return None
+    with session.lock:
+        session.pull(None)
+        return dict(session.game.result(), runId=session.run_id, seq=session.seq)
+
+
+def metrics_text(sessions):
+    gauges = {f'sessions_{k}': v for k, v in sessions.stats().items()}
+    return metrics.registry.render(gauges)
@@ -0,0 +1,229 @@
+"""Asyncio entry point serving the same API as server.py.
+
+The Flask app holds a worker thread for every waiting request, so each
+long poll or event stream costs a thread. This module is a plain ASGI
+application that waits with ``asyncio.sleep`` instead, so one process can
+keep thousands of ``/next?wait=`` polls and ``/stream`` connections open::
+
+    uvicorn asgi:app --port 5000
+
+The endpoints themselves live in api.py, shared with the Flask app.
+Engine steps run directly on the event loop. A whole battle resolves in
+a few milliseconds and a request advances it by at most
+``api.MAX_BATCH`` events, which is less than an executor round trip
+would add. With ``SESSION_STORE`` set, session lookups and creation read
+and write SQLite and go to the default executor instead (see
+:func:`offload`); a request may still wait briefly for a session lock
+the store's write-behind thread holds while packing that run. Files
+under ``static/`` are served as by the Flask app.
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import time
+from urllib.parse import parse_qs
+
+from sessions import SessionRegistry
+import api
+import metrics
+import protocol
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+sessions = SessionRegistry.from_env()
+
+TIMED_PATHS = {'/start', '/next'}
+
+if os.environ.get('METRICS'):
+    metrics.enable()
+
+
+# --- requests and responses ----------------------------------------------
+
+def _convert(value, default, type):
+    if value is None:
+        return default
+    try:
+        return type(value)
+    except ValueError:
+        return default
+
+
+class Request:
+    """Path, query arguments and headers of one HTTP request."""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        query = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+        self.args = {k: v[0] for k, v in query.items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+
+    def arg(self, name, default=None, type=str):
+        return _convert(self.args.get(name), default, type)
+
+    def header(self, name, default=None, type=str):
+        return _convert(self.headers.get(name.lower()), default, type)
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=()):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.headers = [(b'content-type', content_type.encode())]
+        self.headers += [(k.encode(), v.encode()) for k, v in headers]
+
+    async def __call__(self, receive, send):
+        headers = self.headers + [(b'content-length', str(len(self.body)).encode())]
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+class EventStream(Response):
+    """Server-sent events produced by an async generator of chunks."""
+
+    def __init__(self, chunks):
+        super().__init__(content_type='text/event-stream',
+                         headers=[('cache-control', 'no-cache'), ('x-accel-buffering', 'no')])
+        self.chunks = chunks
+
+    async def __call__(self, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': self.headers})
+        gone = asyncio.ensure_future(_disconnected(receive))
+        try:
+            async for chunk in self.chunks:
+                if gone.done():
+                    return
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            if not gone.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            gone.cancel()
+            await self.chunks.aclose()
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def jsonify(payload):
+    return Response(json.dumps(payload, separators=(',', ':')))
+
+
+def respond(compact, payload):
+    if compact:
+        return Response(protocol.dumps(payload), content_type=protocol.MEDIA_TYPE,
+                        headers=[('vary', 'Accept')])
+    return jsonify(payload)
+
+
+async def offload(fn, *args):
+    """``fn(*args)`` in a worker thread when the registry has a store.
+
+    Creating a session writes it to the store and looking up a run that
+    is not in memory reads it back, both blocking SQLite calls; without
+    a store they are dictionary lookups and run on the loop.
+    """
+    if sessions.store is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def static_file(path):
+    full = os.path.normpath(os.path.join(STATIC_DIR, path.lstrip('/') or 'index.html'))
+    if not full.startswith(STATIC_DIR + os.sep) or not os.path.isfile(full):
+        return Response('Not Found', 404, 'text/plain')
+    content_type = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type.endswith(('javascript', 'json')):
+        content_type += '; charset=utf-8'
+    with open(full, 'rb') as f:
+        return Response(f.read(), content_type=content_type)
+
+
+# --- endpoints -------------------------------------------------------------
+
+async def protocol_schema(request):
+    return jsonify(protocol.schema())
+
+async def start(request):
+    return respond(*await offload(api.start, sessions, request.arg, request.header))
+
+async def next_event(request):
+    poll = await offload(api.Poll, sessions, request.arg, request.header)
+    if poll.delay:
+        await asyncio.sleep(poll.delay)
+    return respond(*poll.reply())
+
+async def stream(request):
+    events = await offload(api.Stream, sessions, request.arg, request.header)
+    if not events.found:
+        # 204 tells EventSource not to reconnect
+        return Response(status=204)
+
+    async def generate():
+        for chunk in events.chunks():
+            if chunk is None:
+                await asyncio.sleep(events.pause)
+            else:
+                yield chunk
+
+    return EventStream(generate())
+
+async def state(request):
+    return jsonify(await offload(api.state, sessions, request.arg))
+
+async def skip(request):
+    return jsonify(await offload(api.skip, sessions, request.arg))
+
+async def stats(request):
+    return jsonify(sessions.stats())
+
+async def metrics_endpoint(request):
+    return Response(api.metrics_text(sessions), content_type='text/plain; version=0.0.4')
+
+
+ROUTES = {
+    '/protocol': protocol_schema,
+    '/start': start,
+    '/next': next_event,
+    '/stream': stream,
+    '/state': state,
+    '/skip': skip,
+    '/stats': stats,
+    '/metrics': metrics_endpoint,
+}
+
+
+# --- application -----------------------------------------------------------
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    request = Request(scope)
+    if request.method not in ('GET', 'HEAD'):
+        response = Response('Method Not Allowed', 405, 'text/plain')
+    elif request.path in ROUTES:
+        started = time.perf_counter()
+        response = await ROUTES[request.path](request)
+        if metrics.enabled() and request.path in TIMED_PATHS:
+            metrics.registry.observe('request', time.perf_counter() - started, request.path)
+    else:
+        response = static_file(request.path)
+    await response(receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, port=int(os.environ.get('PORT', 5000)))
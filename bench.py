@@ -0,0 +1,341 @@
+"""Engine benchmarks.
+
+Without arguments the regression suite runs under fixed seeds; results
+can be saved as a JSON baseline and later runs checked against it::
+
+    python bench.py --save bench_baseline.json
+    python bench.py --check bench_baseline.json --threshold 0.15
+
+Named benchmarks print comparison tables instead::
+
+    python bench.py paths maps wire
+"""
+
+import argparse
+import functools
+import gzip
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import protocol
+from engine import Game, Goblin, Map, Troll, Warrior
+
+MISSIONS = ("capture_point", "escort", "survival", "destroy_shrine")
+
+
+def _timeit(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _crowded_game(size, units, density=0.2, seed=0):
+    """Game on a ``size`` x ``size`` map with random walls and goblins."""
+    rng = random.Random(seed)
+    game = Game(seed=seed, mission="capture_point")
+    game.map = Map(size, size, preset="arena_ruins")
+    for i in range(size * size):
+        if rng.random() < density:
+            game.map.set_terrain(i % size, i // size, "obstacle", passable=False)
+    game._occupancy = {}
+    game._occupancy_version += 1
+    placed = []
+    while len(placed) < units:
+        x, y = rng.randrange(size), rng.randrange(size)
+        if game.map.passable[game.map.index(x, y)] and not game.is_occupied(x, y):
+            g = Goblin()
+            g.x, g.y = x, y
+            game._occupy(g)
+            placed.append(g)
+    return game, placed
+
+
+def bench_paths(sizes=(8, 32, 64, 128), units=(10, 100), targets=4):
+    """One simulated round: every unit paths to one of a few targets."""
+    rows = []
+    for size in sizes:
+        for count in units:
+            if count > size * size // 4:
+                continue
+            game, placed = _crowded_game(size, count)
+            goals = [(t.x, t.y) for t in placed[:targets]]
+
+            def run(find):
+                for i, u in enumerate(placed):
+                    find((u.x, u.y), goals[i % len(goals)], mover=u)
+
+            def fields():
+                game._fields_version = -1
+                run(game.find_path)
+
+            bfs = _timeit(lambda: run(game.find_path_bfs))
+            field = _timeit(fields)
+            rows.append((size, count, bfs * 1000, field * 1000, bfs / field))
+    print(f"{'map':>9}{'units':>7}{'bfs ms':>10}{'field ms':>10}{'speedup':>9}")
+    for size, count, bfs, field, ratio in rows:
+        print(f"{size:>4}x{size:<4}{count:>7}{bfs:>10.2f}{field:>10.2f}{ratio:>8.1f}x")
+    return rows
+
+
+def bench_maps(sizes=(8, 16, 32, 64, 100, 128), battles=5):
+    """Game construction, pathing and full battles as generated maps grow."""
+    rows = []
+    for size in sizes:
+        options = {"seed": 1}
+        construct = _timeit(lambda: Game(seed=0, map_size=(size, size), map_options=options), repeat=5)
+        game = Game(seed=0, mission="capture_point", map_size=(size, size), map_options=options)
+        corner = (size - 1, size - 1)
+        path = _timeit(lambda: game.find_path_bfs((0, 0), corner), repeat=5)
+        per_mission = []
+        for mission in ("capture_point", "destroy_shrine"):
+            t0 = time.perf_counter()
+            events = 0
+            for seed in range(battles):
+                g = Game(seed=seed, mission=mission, map_size=(size, size), map_options=options)
+                events += sum(1 for _ in g._events())
+            elapsed = time.perf_counter() - t0
+            per_mission.append((battles / elapsed, events / elapsed))
+        rows.append((size, construct * 1000, path * 1000, per_mission))
+    print(f"{'map':>9}{'Game() ms':>11}{'path ms':>9}{'capture b/s':>13}{'ev/s':>9}{'shrine b/s':>12}{'ev/s':>9}")
+    for size, construct, path, ((cb, ce), (sb, se)) in rows:
+        print(f"{size:>4}x{size:<4}{construct:>11.2f}{path:>9.2f}{cb:>13.1f}{ce:>9.0f}{sb:>12.1f}{se:>9.0f}")
+    return rows
+
+
+def bench_wire(battles=200):
+    """Bytes per battle on the wire, plain JSON against the compact protocol."""
+    rows = []
+    for mission in MISSIONS:
+        sizes = [0, 0, 0, 0]
+        for seed in range(battles):
+            game = Game(seed=seed, mission=mission)
+            encoder = protocol.Encoder(game.map.width)
+            plain, compact = [], []
+            for ev in game._events():
+                plain.append(json.dumps(ev, separators=(",", ":")).encode())
+                compact.append(protocol.dumps(encoder.encode(ev)).encode())
+            for i, chunks in enumerate((plain, compact)):
+                sizes[i] += sum(map(len, chunks))
+                sizes[i + 2] += len(gzip.compress(b"\n".join(chunks)))
+        json_b, compact_b, json_gz, compact_gz = (n / battles for n in sizes)
+        rows.append((mission, json_b, compact_b, json_gz, compact_gz))
+    print(f"{'mission':<16}{'json B':>9}{'compact B':>11}{'ratio':>7}{'json gz':>9}{'compact gz':>12}{'ratio':>7}")
+    for mission, jb, cb, jg, cg in rows:
+        print(f"{mission:<16}{jb:>9.0f}{cb:>11.0f}{cb / jb:>7.2f}{jg:>9.0f}{cg:>12.0f}{cg / jg:>7.2f}")
+    return rows
+
+
+BENCHMARKS = {
+    "paths": bench_paths,
+    "maps": bench_maps,
+    "wire": bench_wire,
+}
+
+
+# --- regression suite ----------------------------------------------------
+
+def _rate(fn, min_time=0.2, repeat=3):
+    """Best calls per second of ``fn(i)`` over ``repeat`` timed windows."""
+    best = 0.0
+    i = 0
+    for _ in range(repeat):
+        calls = 0
+        t0 = time.perf_counter()
+        while True:
+            fn(i)
+            i += 1
+            calls += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= min_time:
+                break
+        best = max(best, calls / elapsed)
+    return best
+
+
+def case_map_init():
+    return {"ops_per_sec": _rate(lambda i: Map(preset="arena_ruins"))}
+
+
+def case_game_init():
+    return {"ops_per_sec": _rate(lambda i: Game(seed=i))}
+
+
+def case_find_path():
+    game = Game(seed=0, mission="capture_point", map_size=(64, 64), map_options={"seed": 1})
+    mover = game.heroes[0]
+    goal = (63, 63)
+
+    def run(i):
+        # a fresh occupancy version forces the distance field to be rebuilt
+        game._occupancy_version += 1
+        game.find_path((mover.x, mover.y), goal, mover=mover)
+
+    return {"ops_per_sec": _rate(run)}
+
+
+def case_line_of_sight():
+    game_map = Map.generate(32, 32, obstacles=0.25, seed=1)
+    rng = random.Random(0)
+    pairs = [
+        (rng.randrange(32), rng.randrange(32), rng.randrange(32), rng.randrange(32))
+        for _ in range(1024)
+    ]
+    for p in pairs:
+        game_map.line_of_sight(*p)
+    return {"ops_per_sec": _rate(lambda i: game_map.line_of_sight(*pairs[i & 1023]))}
+
+
+def case_attack():
+    attacker = Warrior()
+    attacker.rng = random.Random(0)
+    target = Troll()
+
+    def run(i):
+        target.hp = target.max_hp
+        target.poison_turns = 0
+        attacker.attack(target)
+
+    return {"ops_per_sec": _rate(run)}
+
+
+def case_step_round():
+    games = []
+    for seed in range(200):
+        game = Game(seed=seed, mission="survival")
+        # rounds are played whole, so once the first round event is out
+        # every timed step starts a fresh one
+        for ev in game._events():
+            if ev["type"] == "round":
+                break
+        if not game.winner():
+            games.append(game)
+    t0 = time.perf_counter()
+    for game in games:
+        for _ in game.step():
+            pass
+    return {"ops_per_sec": len(games) / (time.perf_counter() - t0)}
+
+
+def case_prebattle():
+    games = []
+    for seed in range(100):
+        game = Game(seed=seed, mission="capture_point", map_size=(32, 32))
+        game._advance()
+        games.append(game)
+    ticks = 0
+    t0 = time.perf_counter()
+    for game in games:
+        while game._stage == "prebattle":
+            game._advance()
+            ticks += 1
+    return {"ticks_per_sec": ticks / (time.perf_counter() - t0)}
+
+
+def _drain(mission, battles):
+    events = 0
+    for seed in range(battles):
+        events += sum(1 for _ in Game(seed=seed, mission=mission)._events())
+    return events
+
+
+def case_drain(mission, battles=200):
+    t0 = time.perf_counter()
+    events = _drain(mission, battles)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    _drain(mission, 20)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "battles_per_sec": battles / elapsed,
+        "events_per_sec": events / elapsed,
+        "peak_kb": peak / 1024,
+    }
+
+
+SUITE = {
+    "map_init": case_map_init,
+    "game_init": case_game_init,
+    "find_path_64": case_find_path,
+    "line_of_sight": case_line_of_sight,
+    "attack": case_attack,
+    "step_round": case_step_round,
+    "prebattle_32": case_prebattle,
+}
+SUITE.update({f"drain_{m}": functools.partial(case_drain, m) for m in MISSIONS})
+
+# metrics where a smaller number is the better one
+LOWER_IS_BETTER = {"peak_kb"}
+
+
+def run_suite(names=None):
+    results = {}
+    for name, case in SUITE.items():
+        if names and name not in names:
+            continue
+        random.seed(0)
+        results[name] = case()
+        metrics = "  ".join(f"{k}={v:,.1f}" for k, v in results[name].items())
+        print(f"{name:<24}{metrics}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List of human readable regressions beyond ``threshold`` (a ratio)."""
+    regressions = []
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            old = baseline.get(name, {}).get(key)
+            if not old:
+                continue
+            change = (value - old) / old
+            if key in LOWER_IS_BETTER:
+                change = -change
+            if change < -threshold:
+                regressions.append(f"{name}.{key}: {old:,.1f} -> {value:,.1f} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: suite)")
+    parser.add_argument("--only", nargs="+", metavar="CASE", help="run only these suite cases")
+    parser.add_argument("--save", metavar="FILE", help="write suite results as a JSON baseline")
+    parser.add_argument("--check", metavar="FILE", help="compare suite results with a baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed slowdown before --check fails (default 0.15)")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    if args.names:
+        for name in args.names:
+            print(f"== {name}")
+            BENCHMARKS[name]()
+        return 0
+    results = run_suite(args.only)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,69 +1,313 @@
+import json
+import os
 import random
-from collections import deque
+import weakref
+from collections import deque, namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+
+TERRAINS = (
+    "plain",
+    "obstacle",
+    "hazard_poison",
+    "shrine",
+    "exit",
+    "control_point",
+    "enemy_shrine",
+)
+TERRAIN_CODES = {name: code for code, name in enumerate(TERRAINS)}
+PLAIN, OBSTACLE, HAZARD_POISON, SHRINE = range(4)
+
+HEROES = "Heroes"
+MONSTERS = "Monsters"
+OPPONENT = {HEROES: MONSTERS, MONSTERS: HEROES}
+
+# neighbour order matters: it decides which of several shortest paths BFS picks
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+_neighbor_tables = {}
+
+
+def neighbor_table(width, height):
+    """Neighbour indices of every tile, shared by all maps of one size."""
+    table = _neighbor_tables.get((width, height))
+    if table is None:
+        rows = []
+        for y in range(height):
+            for x in range(width):
+                rows.append(tuple(
+                    (y + dy) * width + x + dx
+                    for dx, dy in DIRECTIONS
+                    if 0 <= x + dx < width and 0 <= y + dy < height
+                ))
+        table = _neighbor_tables[(width, height)] = tuple(rows)
+    return table
+
+
+def reserved_tiles(width, height):
+    """Tiles ``Game`` places units or objectives on for a map size."""
+    tiles = {(0, 0), (1, 0), (0, 1), (1, 1)}
+    tiles.update((width - 2, y) for y in range(min(2, height)))
+    # survival waves spawn anywhere on the right edge
+    tiles.update((width - 1, y) for y in range(height))
+    tiles.add((width // 2, height // 2))
+    tiles.add((width - 2, height // 2))
+    return {(x, y) for x, y in tiles if 0 <= x < width and 0 <= y < height}
+
+
+@lru_cache(maxsize=64)
+def generate_layout(width, height, obstacles=0.15, hazards=0.02, shrines=0.005, seed=0):
+    """Random terrain codes for a ``width`` x ``height`` map.
+
+    Densities are per-tile probabilities. Every passable tile is reachable
+    from every other one and the tiles from ``reserved_tiles`` stay plain.
+    Layouts are cached by their arguments, so reusing a seed is free.
+    """
+    rng = random.Random(seed)
+    size = width * height
+    terrain = bytearray(size)
+    reserved = {y * width + x for x, y in reserved_tiles(width, height)}
+    for i in range(size):
+        if i in reserved:
+            continue
+        r = rng.random()
+        if r < obstacles:
+            terrain[i] = OBSTACLE
+        elif r < obstacles + hazards:
+            terrain[i] = HAZARD_POISON
+        elif r < obstacles + hazards + shrines:
+            terrain[i] = SHRINE
+    adjacent = neighbor_table(width, height)
+
+    def flood():
+        seen = bytearray(size)
+        seen[0] = 1
+        queue = deque([0])
+        while queue:
+            for n in adjacent[queue.popleft()]:
+                if not seen[n] and terrain[n] != OBSTACLE:
+                    seen[n] = 1
+                    queue.append(n)
+        return seen
+
+    seen = flood()
+    for i in sorted(reserved):
+        if seen[i]:
+            continue
+        # carve an L-shaped corridor back to the origin
+        x, y = i % width, i // width
+        while x or y:
+            if x:
+                x -= 1
+            else:
+                y -= 1
+            if terrain[y * width + x] == OBSTACLE:
+                terrain[y * width + x] = PLAIN
+        seen = flood()
+    # wall off whatever pockets are left
+    for i in range(size):
+        if not seen[i]:
+            terrain[i] = OBSTACLE
+    return bytes(terrain)
 
 
 class Map:
-    """Simple tile map for the battlefield."""
-
-    def __init__(self, width=8, height=5, preset=None):
+    """Simple tile map for the battlefield.
+
+    Tiles live in flat row-major ``bytearray``s (terrain code and passable
+    flag) indexed by ``y * width + x``; ``tile()`` builds the dict form
+    used in events on demand.
+    """
+
+    # line of sight is tabulated for targets up to this many tiles away
+    LOS_RADIUS = 8
+
+    PRESETS = {
+        "arena_ruins": {
+            "obstacles": [(3, 1), (4, 3)],
+            "hazards": [(2, 2)],
+            "shrines": [(5, 2)],
+        },
+        "arena_forest": {
+            "obstacles": [(1, 3), (6, 1)],
+            "hazards": [(3, 2)],
+            "shrines": [(4, 4)],
+        },
+        "arena_cavern": {
+            "obstacles": [(3, 0), (3, 1), (4, 3)],
+            "hazards": [(5, 1)],
+            "shrines": [(2, 4)],
+        },
+    }
+
+    def __init__(self, width=8, height=5, preset=None, rng=random, layout=None):
         self.width = width
         self.height = height
-        self.tiles = {}
+        self.terrain = bytearray(width * height)
+        self.passable = bytearray(b"\x01") * (width * height)
+        self.adjacent = neighbor_table(width, height)
         self.shrines = set()
-        presets = {
-            "arena_ruins": {
-                "obstacles": [(3, 1), (4, 3)],
-                "hazards": [(2, 2)],
-                "shrines": [(5, 2)],
-            },
-            "arena_forest": {
-                "obstacles": [(1, 3), (6, 1)],
-                "hazards": [(3, 2)],
-                "shrines": [(4, 4)],
-            },
-            "arena_cavern": {
-                "obstacles": [(3, 0), (3, 1), (4, 3)],
-                "hazards": [(5, 1)],
-                "shrines": [(2, 4)],
-            },
-        }
-        if preset is None:
-            preset = random.choice(list(presets.keys()))
-        layout = presets[preset]
-        for y in range(height):
-            for x in range(width):
-                terrain = "plain"
-                passable = True
-                if (x, y) in layout.get("obstacles", []):
-                    terrain = "obstacle"
-                    passable = False
-                elif (x, y) in layout.get("hazards", []):
-                    terrain = "hazard_poison"
-                elif (x, y) in layout.get("shrines", []):
-                    terrain = "shrine"
-                    self.shrines.add((x, y))
-                self.tiles[(x, y)] = {
-                    "x": x,
-                    "y": y,
-                    "terrain": terrain,
-                    "passable": passable,
-                }
+        # source tile -> visibility of the window around it
+        self._los_rows = {}
+        # (source tile, radius) -> tiles seen within that many steps
+        self._sight_zones = {}
+        if layout is not None:
+            self.terrain[:] = layout
+        else:
+            if preset is None:
+                preset = rng.choice(list(self.PRESETS.keys()))
+            layout = self.PRESETS[preset]
+            # obstacles beat hazards beat shrines where a preset lists a tile twice
+            for key, code in (("shrines", SHRINE), ("hazards", HAZARD_POISON), ("obstacles", OBSTACLE)):
+                for x, y in layout.get(key, []):
+                    if self.in_bounds(x, y):
+                        self.terrain[y * width + x] = code
+        for i, code in enumerate(self.terrain):
+            if code == OBSTACLE:
+                self.passable[i] = 0
+            elif code == SHRINE:
+                self.shrines.add(self.coords(i))
+
+    @classmethod
+    def generate(cls, width, height, obstacles=0.15, hazards=0.02, shrines=0.005, seed=0):
+        """Procedurally generated map, see ``generate_layout``."""
+        layout = generate_layout(width, height, obstacles, hazards, shrines, seed)
+        return cls(width, height, layout=layout)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def coords(self, i):
+        y, x = divmod(i, self.width)
+        return x, y
 
     def tile(self, x, y):
-        return self.tiles.get((x, y))
+        if not self.in_bounds(x, y):
+            return None
+        i = y * self.width + x
+        return {
+            "x": x,
+            "y": y,
+            "terrain": TERRAINS[self.terrain[i]],
+            "passable": bool(self.passable[i]),
+        }
+
+    def terrain_at(self, x, y):
+        return TERRAINS[self.terrain[y * self.width + x]]
+
+    def set_terrain(self, x, y, terrain, passable=None):
+        i = y * self.width + x
+        code = TERRAIN_CODES[terrain]
+        if (code == OBSTACLE) != (self.terrain[i] == OBSTACLE):
+            self._los_rows.clear()
+            self._sight_zones.clear()
+        self.terrain[i] = code
+        if passable is not None:
+            self.passable[i] = passable
+
+    def line_of_sight(self, ax, ay, bx, by):
+        """True when no obstacle lies strictly between the two tiles.
+
+        Sight lines are Bresenham lines, always traced from the smaller
+        endpoint so the relation is symmetric. Results for nearby targets
+        come from a per-tile table built on first use.
+        """
+        r = self.LOS_RADIUS
+        dx = bx - ax
+        dy = by - ay
+        if -r <= dx <= r and -r <= dy <= r:
+            row = self._los_rows.get(ay * self.width + ax)
+            if row is None:
+                row = self._los_row(ax, ay)
+            return row[(dy + r) * (2 * r + 1) + dx + r] == 1
+        return self._trace(ax, ay, bx, by)
+
+    def sight_zone(self, x, y, radius):
+        """Indexes of the tiles within ``radius`` steps of ``(x, y)`` that
+        are in line of sight of it."""
+        key = (y * self.width + x, radius)
+        zone = self._sight_zones.get(key)
+        if zone is None:
+            zone = frozenset(
+                ty * self.width + tx
+                for ty in range(max(0, y - radius), min(self.height, y + radius + 1))
+                for tx in range(max(0, x - radius), min(self.width, x + radius + 1))
+                if abs(tx - x) + abs(ty - y) <= radius and self.line_of_sight(x, y, tx, ty)
+            )
+            self._sight_zones[key] = zone
+        return zone
+
+    def _los_row(self, ax, ay):
+        r = self.LOS_RADIUS
+        row = bytearray((2 * r + 1) ** 2)
+        k = 0
+        for y in range(ay - r, ay + r + 1):
+            for x in range(ax - r, ax + r + 1):
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    row[k] = self._trace(ax, ay, x, y)
+                k += 1
+        self._los_rows[ay * self.width + ax] = row
+        return row
+
+    def _trace(self, ax, ay, bx, by):
+        if (bx, by) < (ax, ay):
+            ax, ay, bx, by = bx, by, ax, ay
+        terrain = self.terrain
+        width = self.width
+        dx = abs(bx - ax)
+        dy = -abs(by - ay)
+        sx = 1 if ax < bx else -1
+        sy = 1 if ay < by else -1
+        err = dx + dy
+        x, y = ax, ay
+        while (x, y) != (bx, by):
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x += sx
+            if e2 <= dx:
+                err += dx
+                y += sy
+            if (x, y) != (bx, by) and terrain[y * width + x] == OBSTACLE:
+                return False
+        return True
+
+    @property
+    def tiles(self):
+        """Dict view of every tile keyed by ``(x, y)``."""
+        return {(t["x"], t["y"]): t for t in self.tile_list()}
+
+    def tile_list(self):
+        return [self.tile(x, y) for y in range(self.height) for x in range(self.width)]
 
     def neighbors(self, x, y):
-        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.width and 0 <= ny < self.height:
-                yield nx, ny
+        width = self.width
+        for i in self.adjacent[y * width + x]:
+            yield i % width, i // width
 
 
 class Character:
     """Base character with combat utilities and status management."""
 
+    __slots__ = (
+        "name", "max_hp", "hp", "attack_range", "icon", "base_speed",
+        "base_crit", "move_points", "range", "rng", "x", "y",
+        "patrol_path", "wander_area", "_patrol_index",
+        "poison", "poison_turns", "shield", "rage",
+        "aim", "frenzy", "hexed", "regen",
+        "dealt", "taken",
+        # filled in by the UnitRegistry of the unit's game
+        "uid", "side", "registry",
+        # only set while the unit's numbers live in a unitstore.UnitStore
+        "_store", "_row",
+    )
+
     def __init__(self, name, hp, attack_range, icon, speed=1, crit=0.2,
-                 move_points=3, attack_distance=1):
+                 move_points=3, attack_distance=1, regen=0):
         self.name = name
         self.max_hp = hp
         self.hp = hp
@@ -74,6 +318,8 @@ class Character:
         self.base_crit = crit
         self.move_points = move_points
         self.range = attack_distance
+        # random source, replaced by the owning game's generator
+        self.rng = random
         # grid position
         self.x = 0
         self.y = 0
@@ -93,12 +339,23 @@ class Character:
         self.aim = 0  # next attack bonus
         self.frenzy = 0  # turns remaining
         self.hexed = 0  # turns remaining
-        self.regen = 0  # per turn heal amount
+        self.regen = regen  # per turn heal amount
+
+        # battle statistics
+        self.dealt = 0
+        self.taken = 0
+        self.uid = None
+        self.side = None
+        self.registry = None
 
     # --- core helpers ---------------------------------------------------
     def is_alive(self):
         return self.hp > 0
 
+    def _registry(self):
+        # held weakly, see UnitRegistry.add: a unit can outlive its game
+        return None if self.registry is None else self.registry()
+
     @property
     def speed(self):
         """Effective speed taking frenzy into account."""
@@ -113,7 +370,10 @@ class Character:
             if isinstance(self, Troll):
                 dmg *= 2
             self.hp = max(self.hp - dmg, 0)
+            self.taken += dmg
             self.poison_turns -= 1
+            if self.hp == 0 and self._registry() is not None:
+                self._registry().died(self)
             events.append({
                 "type": "damage",
                 "target": self.name,
@@ -169,7 +429,11 @@ class Character:
                     "amount": absorbed,
                     "remaining": self.shield,
                 })
+        alive = self.hp > 0
         self.hp = max(self.hp - dmg, 0)
+        self.taken += dmg
+        if alive and self.hp == 0 and self._registry() is not None:
+            self._registry().died(self)
         events.append({
             "type": "damage",
             "target": self.name,
@@ -184,7 +448,7 @@ class Character:
         chance = self.base_crit
         if self.aim:
             chance += 0.5
-        return random.random() < chance
+        return self.rng.random() < chance
 
     def _damage_mod(self):
         dmg = 1.0
@@ -200,7 +464,7 @@ class Character:
 
     def attack(self, other):
         events = []
-        dmg = random.randint(*self.attack_range)
+        dmg = self.rng.randint(*self.attack_range)
         dmg = int(dmg * self._damage_mod())
         crit = self._crit()
         if crit:
@@ -212,9 +476,11 @@ class Character:
             "damage": dmg,
             "crit": crit,
         })
+        taken = other.taken
         events.extend(other.take_damage(dmg))
-        if random.random() < 0.1 and other.is_alive():
-            other.poison = random.randint(1, 3)
+        self.dealt += other.taken - taken
+        if self.rng.random() < 0.1 and other.is_alive():
+            other.poison = self.rng.randint(1, 3)
             other.poison_turns = 3
             events.append({
                 "type": "status",
@@ -225,18 +491,24 @@ class Character:
             })
         return events
 
+    def _restore(self, amount):
+        # a unit killed mid-walk can still be healed by a shrine it reaches
+        if self.hp == 0 and amount > 0 and self._registry() is not None:
+            self._registry().revived(self)
+        self.hp += amount
+
     def heal_self(self):
         events = []
-        amt = random.randint(1, 5)
-        self.hp = min(self.hp + amt, self.max_hp)
+        amt = self.rng.randint(1, 5)
+        self._restore(min(amt, self.max_hp - self.hp))
         events.append({
             "type": "heal",
             "actor": self.name,
             "amount": amt,
             "hp": self.hp,
         })
-        if random.random() < 0.3:
-            shield_amt = random.randint(1, 3)
+        if self.rng.random() < 0.3:
+            shield_amt = self.rng.randint(1, 3)
             self.shield += shield_amt
             events.append({
                 "type": "status",
@@ -264,13 +536,8 @@ class Character:
             if dist > self.range:
                 return events
         if self.range > 1 and not game.line_of_sight(self, target):
-            events.append({
-                "type": "los_blocked",
-                "attacker_id": self.name,
-                "target_id": target.name,
-            })
-            return events
-        if random.random() < 0.8:
+            return game.blocked_shot(self, target, events)
+        if game.rng.random() < 0.8:
             events.extend(self.attack(target))
         else:
             events.extend(self.heal_self())
@@ -281,8 +548,10 @@ class Character:
 
 
 class Warrior(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Warrior", 30, (4, 8), "⚔️", speed=2, attack_distance=1)
+        super().__init__(*UNIT_TEMPLATES["Warrior"].stats)
 
     def take_turn(self, allies, enemies, game):
         if not enemies:
@@ -298,7 +567,7 @@ class Warrior(Character):
             dist = game.distance(self, target)
             if dist > self.range:
                 return events
-        r = random.random()
+        r = game.rng.random()
         if r < 0.2:
             game.taunt_target = self
             events.append({"type": "status", "status": "taunt", "actor": self.name})
@@ -310,8 +579,10 @@ class Warrior(Character):
 
 
 class Mage(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Mage", 20, (5, 10), "🧙", speed=2, attack_distance=3)
+        super().__init__(*UNIT_TEMPLATES["Mage"].stats)
 
     def take_turn(self, allies, enemies, game):
         if not enemies:
@@ -324,13 +595,12 @@ class Mage(Character):
             dist = game.distance(self, target)
             if dist > self.range:
                 return events
-        r = random.random()
+        r = game.rng.random()
         if r < 0.2 and len(enemies) > 1:
             if not game.line_of_sight(self, target):
-                events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
-                return events
+                return game.blocked_shot(self, target, events)
             events.append({"type": "status", "status": "fireball", "actor": self.name})
-            targets = random.sample(enemies, min(2, len(enemies)))
+            targets = game.rng.sample(enemies, min(2, len(enemies)))
             for t in targets:
                 if game.line_of_sight(self, t):
                     events.extend(self.attack(t))
@@ -339,7 +609,7 @@ class Mage(Character):
             return events
         elif r < 0.9:
             if self.range > 1 and not game.line_of_sight(self, target):
-                events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
+                game.blocked_shot(self, target, events)
             else:
                 events.extend(self.attack(target))
         else:
@@ -351,18 +621,24 @@ class Mage(Character):
 
 
 class Goblin(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Goblin", 15, (3, 6), "👺", speed=2, attack_distance=1)
+        super().__init__(*UNIT_TEMPLATES["Goblin"].stats)
 
 
 class Orc(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Orc", 25, (2, 7), "👹", speed=1, move_points=2, attack_distance=1)
+        super().__init__(*UNIT_TEMPLATES["Orc"].stats)
 
 
 class Archer(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Archer", 18, (4, 7), "🏹", speed=3, crit=0.25, attack_distance=3)
+        super().__init__(*UNIT_TEMPLATES["Archer"].stats)
 
     def take_turn(self, allies, enemies, game):
         if not enemies:
@@ -379,9 +655,8 @@ class Archer(Character):
             if dist > self.range:
                 return events
         if self.range > 1 and not game.line_of_sight(self, target):
-            events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
-            return events
-        if self.aim == 0 and random.random() < 0.3:
+            return game.blocked_shot(self, target, events)
+        if self.aim == 0 and game.rng.random() < 0.3:
             self.aim = 1
             events.append({"type": "status", "status": "aim", "actor": self.name, "turns": 1})
         else:
@@ -390,8 +665,10 @@ class Archer(Character):
 
 
 class Priest(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Priest", 18, (1, 4), "⛪", speed=2, attack_distance=2)
+        super().__init__(*UNIT_TEMPLATES["Priest"].stats)
 
     def take_turn(self, allies, enemies, game):
         if enemies:
@@ -401,7 +678,7 @@ class Priest(Character):
         allies_alive = [a for a in allies if a.is_alive()]
         if allies_alive:
             target = min(allies_alive, key=lambda c: c.hp / c.max_hp)
-            heal = random.randint(4, 6)
+            heal = game.rng.randint(4, 6)
             target.hp = min(target.hp + heal, target.max_hp)
             events = [{
                 "type": "heal",
@@ -430,32 +707,34 @@ class Priest(Character):
                 if dist > self.range:
                     return events
             if self.range > 1 and not game.line_of_sight(self, target):
-                events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
-                return events
+                return game.blocked_shot(self, target, events)
             events.extend(self.attack(target))
             return events
         return []
 
 
 class Troll(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Troll", 40, (3, 7), "🧌", speed=1, move_points=2, attack_distance=1)
-        self.regen = 2
+        super().__init__(*UNIT_TEMPLATES["Troll"].stats)
 
 
 class Shaman(Character):
+    __slots__ = ()
+
     def __init__(self):
-        super().__init__("Shaman", 20, (2, 5), "🌀", speed=2, move_points=2, attack_distance=2)
+        super().__init__(*UNIT_TEMPLATES["Shaman"].stats)
 
     def take_turn(self, allies, enemies, game):
         if enemies:
             kite_ev = game.kite(self, enemies)
             if kite_ev:
                 return kite_ev
-        r = random.random()
+        r = game.rng.random()
         allies_alive = [a for a in allies if a.is_alive() and a is not self]
         if r < 0.5 and allies_alive:
-            target = random.choice(allies_alive)
+            target = game.rng.choice(allies_alive)
             target.frenzy = 2
             return [{
                 "type": "status",
@@ -474,8 +753,7 @@ class Shaman(Character):
                 if dist > self.range:
                     return events
             if self.range > 1 and not game.line_of_sight(self, target):
-                events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
-                return events
+                return game.blocked_shot(self, target, events)
             target.hexed = 1
             events.append({
                 "type": "status",
@@ -495,8 +773,7 @@ class Shaman(Character):
                 if dist > self.range:
                     return events
             if self.range > 1 and not game.line_of_sight(self, target):
-                events.append({"type": "los_blocked", "attacker_id": self.name, "target_id": target.name})
-                return events
+                return game.blocked_shot(self, target, events)
             events.extend(self.attack(target))
             return events
         return []
@@ -507,30 +784,462 @@ class Shaman(Character):
 class EnemyShrine(Character):
     """Immobile structure used for destroy_shrine missions."""
 
-    def __init__(self, hp=20):
-        # use simple id without spaces so frontend ids remain valid
-        super().__init__("shrine", hp, (0, 0), "🏯", speed=0, move_points=0, attack_distance=1)
+    __slots__ = ()
+
+    def __init__(self, hp=None):
+        # units.json names it "shrine": frontend ids must not contain spaces
+        super().__init__(*UNIT_TEMPLATES["EnemyShrine"].stats)
+        if hp is not None:
+            self.max_hp = self.hp = hp
 
     def take_turn(self, allies, enemies, game):
         # Shrine does nothing on its turn
         return []
 
 
+UNIT_CLASSES = {
+    cls.__name__: cls
+    for cls in (Warrior, Mage, Goblin, Orc, Archer, Priest, Troll, Shaman, EnemyShrine)
+}
+
+# unit state kept in game snapshots; rng is the game's own and the rest
+# is unitstore bookkeeping
+UNIT_FIELDS = tuple(
+    f for f in Character.__slots__
+    if f not in ("rng", "uid", "side", "registry", "_store", "_row")
+)
+
+SNAPSHOT_VERSION = 3
+
+
+# --- Unit data ------------------------------------------------------------
+
+# stats and encounter tables; point UNITS_FILE elsewhere to try a balance
+# change without touching the code
+UNITS_FILE = os.environ.get("UNITS_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "units.json")
+
+
+class UnitTemplate(namedtuple("UnitTemplate", "key kind stats tier_bonus")):
+    """Compiled entry of the unit file.
+
+    ``kind`` is the class that plays the unit, ``stats`` the arguments of
+    ``Character.__init__`` and ``tier_bonus`` what odd tiers add to the
+    minimum damage.
+    """
+
+    __slots__ = ()
+
+    def build(self, tier=None):
+        """A fresh unit, scaled to ``tier`` when one is given."""
+        unit = self.kind.__new__(self.kind)
+        Character.__init__(unit, *self.stats)
+        if tier is not None:
+            apply_tier(unit, tier, self.tier_bonus)
+        return unit
+
+
+# ``encounters`` repeats each encounter by its weight and so does every
+# ``picks`` tuple of a slot, so one ``rng.choice`` draws a weighted entry
+UnitData = namedtuple("UnitData", "templates heroes encounters")
+Encounter = namedtuple("Encounter", "name slots")
+EncounterSlot = namedtuple("EncounterSlot", "picks chance")
+
+
+@lru_cache(maxsize=None)
+def load_units(path=UNITS_FILE):
+    """Read and compile the unit file at ``path``, once per path.
+
+    The result is immutable and shared by every game. Unknown classes,
+    units or malformed weights raise ``ValueError``.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    templates = {}
+    for key, spec in data["units"].items():
+        kind = UNIT_CLASSES.get(spec.get("class", key))
+        if kind is None:
+            raise ValueError(f"unit {key!r}: unknown class {spec.get('class', key)!r}")
+        stats = (
+            spec.get("name", key), spec["hp"], tuple(spec["attack"]), spec["icon"],
+            spec.get("speed", 1), spec.get("crit", 0.2), spec.get("move_points", 3),
+            spec.get("range", 1), spec.get("regen", 0),
+        )
+        templates[key] = UnitTemplate(key, kind, stats, spec.get("tier_bonus", 0))
+
+    def template(key):
+        if key not in templates:
+            raise ValueError(f"unknown unit {key!r}")
+        return templates[key]
+
+    def weighted(table, what):
+        entries = []
+        for key, weight in table.items():
+            if not isinstance(weight, int) or weight < 0:
+                raise ValueError(f"{what}: weight of {key!r} must be a non-negative integer")
+            entries.extend([key] * weight)
+        if not entries:
+            raise ValueError(f"{what}: nothing to pick")
+        return tuple(entries)
+
+    encounters = {}
+    for name, spec in data["encounters"].items():
+        slots = []
+        for slot in spec["units"]:
+            if isinstance(slot, str):
+                slot = {"unit": slot}
+            if "pick" in slot:
+                picks = tuple(map(template, weighted(slot["pick"], f"encounter {name!r}")))
+            else:
+                picks = (template(slot["unit"]),)
+            slots.append(EncounterSlot(picks, slot.get("chance", 1)))
+        encounters[name] = (Encounter(name, tuple(slots)), spec.get("weight", 1))
+    table = {name: weight for name, (_, weight) in encounters.items()}
+    return UnitData(
+        MappingProxyType(templates),
+        tuple(map(template, data["heroes"])),
+        tuple(encounters[name][0] for name in weighted(table, "encounters")),
+    )
+
+
+UNITS = load_units()
+UNIT_TEMPLATES = UNITS.templates
+
+
+class UnitRegistry:
+    """Every unit of a battle with a stable id, its side and live counts.
+
+    Units report their own deaths and revivals to the registry, so the
+    counts stay exact without scanning the roster.
+    """
+
+    def __init__(self):
+        # heroes, monsters, then spawns: ``uid`` indexes this list
+        self.roster = []
+        self.alive = {HEROES: 0, MONSTERS: 0}
+        # every death in order; a unit revived and killed again is listed twice
+        self.deaths = []
+        # bumped by every death and revival, which unblock or block a tile
+        self.version = 0
+        # side (None for both) -> living units, until a death or spawn
+        self._living = {}
+        # side -> ThreatMap of its living units, once the game places them
+        self.threat = None
+
+    def add(self, unit, side):
+        unit.uid = len(self.roster)
+        unit.side = side
+        # a weak reference keeps the units from holding their game in a
+        # cycle; once the game is gone they carry on unregistered
+        unit.registry = weakref.ref(self)
+        self.roster.append(unit)
+        if unit.hp > 0:
+            self.alive[side] += 1
+            self._living.clear()
+            if self.threat is not None:
+                self.threat[side].add(unit)
+        else:
+            self.deaths.append(unit)
+
+    def died(self, unit):
+        self.alive[unit.side] -= 1
+        self.version += 1
+        self.deaths.append(unit)
+        self._living.clear()
+        if self.threat is not None:
+            self.threat[unit.side].remove(unit)
+
+    def revived(self, unit):
+        self.alive[unit.side] += 1
+        self.version += 1
+        self._living.clear()
+        if self.threat is not None:
+            self.threat[unit.side].add(unit)
+
+    def living(self, side=None):
+        """Living units of ``side`` (default: all) in roster order.
+
+        The list is shared until the next death or spawn: do not modify it.
+        """
+        units = self._living.get(side)
+        if units is None:
+            units = self._living[side] = [
+                u for u in self.roster if u.hp > 0 and (side is None or u.side == side)
+            ]
+        return units
+
+
+class ThreatMap:
+    """Where the living units of one side can reach without moving.
+
+    ``near[i]`` counts the units on tile ``i`` or next to it and
+    ``melee[i]`` only those with reach 1, whose zone of control covers
+    the tile. The counts follow every move, death and revival, so the AI
+    asks "is an enemy next to me?" in one lookup however large the roster.
+    """
+
+    def __init__(self, game_map):
+        self.map = game_map
+        self.near = [0] * (game_map.width * game_map.height)
+        self.melee = [0] * len(self.near)
+
+    def _mark(self, unit, delta):
+        i = unit.y * self.map.width + unit.x
+        melee = unit.range <= 1
+        for t in (i, *self.map.adjacent[i]):
+            self.near[t] += delta
+            if melee:
+                self.melee[t] += delta
+
+    def add(self, unit):
+        self._mark(unit, 1)
+
+    def remove(self, unit):
+        self._mark(unit, -1)
+
+
+class Objective:
+    """Rules of one mission, plugged into :class:`Game`.
+
+    Progress lives on the game (``objective_progress`` and friends), so
+    snapshots and results do not depend on the mission. A subclass names
+    the event types it reacts to in ``events`` and handles each one in
+    ``on_<type>(game, ev)``. ``on_move(game, unit)`` and
+    ``on_round_end(game)`` are only called where a subclass defines them.
+    Hooks return the events they cause.
+    """
+
+    mission = None
+    events = ()
+    on_move = None
+    on_round_end = None
+    # False: combat starts at once and setup places the monsters
+    prebattle = True
+
+    def setup(self, game):
+        """Mission terrain and units, before the encounter is generated."""
+
+    def encounter(self, game):
+        return game.generate_encounter()
+
+    def init_data(self, game):
+        return {}
+
+    def target_event(self, game):
+        return None
+
+    def subscriptions(self):
+        """Event type -> handler table the game dispatches through."""
+        return {etype: getattr(self, "on_" + etype) for etype in self.events}
+
+
+class CapturePoint(Objective):
+    """Hold the central tile, free of monsters, for three rounds in a row."""
+
+    mission = "capture_point"
+
+    def setup(self, game):
+        game.control_point = (game.map.width // 2, game.map.height // 2)
+        game.map.set_terrain(*game.control_point, "control_point")
+        game.objective_required = 3
+
+    def init_data(self, game):
+        return {
+            "tiles": [{"x": game.control_point[0], "y": game.control_point[1]}],
+            "required": game.objective_required,
+        }
+
+    def on_round_end(self, game):
+        events = []
+        holder = None
+        for h in game.heroes:
+            if h.is_alive() and (h.x, h.y) == game.control_point:
+                holder = h
+                break
+        occupied_by_enemy = any(
+            m.is_alive() and (m.x, m.y) == game.control_point for m in game.monsters
+        )
+        if holder and not occupied_by_enemy:
+            game.objective_progress += 1
+            events.append({
+                "type": "objective_progress",
+                "mission": self.mission,
+                "holder": holder.name,
+                "progress": game.objective_progress,
+                "required": game.objective_required,
+            })
+            if game.objective_progress >= game.objective_required:
+                game.objective_complete = True
+                events.append({"type": "objective_complete", "mission": self.mission})
+        elif game.objective_progress:
+            game.objective_progress = 0
+            events.append({
+                "type": "objective_progress",
+                "mission": self.mission,
+                "progress": 0,
+                "required": game.objective_required,
+            })
+        return events
+
+
+class Escort(Objective):
+    """Walk a priest VIP to the exit tile; losing it fails the mission."""
+
+    mission = "escort"
+    events = ("death",)
+
+    def setup(self, game):
+        game.vip = Priest()
+        game.heroes.append(game.vip)
+        game.exit_tile = (game.map.width - 1, game.map.height - 1)
+        game.map.set_terrain(*game.exit_tile, "exit")
+
+    def init_data(self, game):
+        return {
+            "vip": game.vip.name,
+            "exit": {"x": game.exit_tile[0], "y": game.exit_tile[1]},
+        }
+
+    def on_move(self, game, unit):
+        if unit is game.vip and (unit.x, unit.y) == game.exit_tile:
+            game.objective_complete = True
+            return [{"type": "objective_complete", "mission": self.mission}]
+        return []
+
+    def on_death(self, game, ev):
+        # by name, like the client: a monster priest counts as well
+        if ev["target"] == game.vip.name:
+            game.objective_failed = True
+            return [{"type": "objective_fail", "mission": self.mission}]
+        return []
+
+
+class Survival(Objective):
+    """Last ten rounds while a goblin joins every ``wave_interval`` rounds."""
+
+    mission = "survival"
+
+    def setup(self, game):
+        game.survival_rounds = 10
+        game.objective_required = game.survival_rounds
+
+    def init_data(self, game):
+        return {"rounds": game.survival_rounds, "wave_interval": game.wave_interval}
+
+    def on_round_end(self, game):
+        game.objective_progress += 1
+        events = [{
+            "type": "objective_progress",
+            "mission": self.mission,
+            "progress": game.objective_progress,
+            "required": game.objective_required,
+        }]
+        if game.objective_progress >= game.objective_required:
+            game.objective_complete = True
+            events.append({"type": "objective_complete", "mission": self.mission})
+        elif game.objective_progress % game.wave_interval == 0:
+            # spawn a simple goblin at enemy edge
+            g = Goblin()
+            game.spawn(g, game.map.width - 1, game.rng.randrange(game.map.height))
+            events.append({
+                "type": "wave_spawn",
+                "round": game.round,
+                "monsters": [game._char_info(g)],
+            })
+        return events
+
+
+class DestroyShrine(Objective):
+    """Knock down an enemy shrine; no other monsters take part."""
+
+    mission = "destroy_shrine"
+    events = ("damage", "death")
+    prebattle = False
+
+    def setup(self, game):
+        game.shrine = EnemyShrine()
+        # place shrine near enemy side
+        game.shrine.x = game.map.width - 2
+        game.shrine.y = game.map.height // 2
+        # make the shrine tile impassable so units stop adjacent
+        game.map.set_terrain(game.shrine.x, game.shrine.y, "enemy_shrine", passable=False)
+
+    def encounter(self, game):
+        return [game.shrine]
+
+    def init_data(self, game):
+        return {"shrine": {"x": game.shrine.x, "y": game.shrine.y, "hp": game.shrine.hp}}
+
+    def target_event(self, game):
+        return {
+            "type": "objective_target",
+            "id": game.shrine.name,
+            "pos": {"x": game.shrine.x, "y": game.shrine.y},
+        }
+
+    def on_damage(self, game, ev):
+        if ev["target"] == game.shrine.name:
+            return [{
+                "type": "objective_progress",
+                "mission": self.mission,
+                "progress": game.shrine.max_hp - game.shrine.hp,
+                "required": game.shrine.max_hp,
+            }]
+        return []
+
+    def on_death(self, game, ev):
+        if ev["target"] == game.shrine.name:
+            game.objective_complete = True
+            return [{"type": "objective_complete", "mission": self.mission}]
+        return []
+
+
+# mission name -> objective; Game picks among these in this order
+OBJECTIVES = {cls.mission: cls for cls in (CapturePoint, Escort, Survival, DestroyShrine)}
+
+
+def apply_tier(monster, tier, attack_bonus=0):
+    """Scale a freshly generated monster to the encounter tier.
+
+    ``attack_bonus`` is its template's ``tier_bonus``: odd tiers add it to
+    the minimum damage.
+    """
+    monster.max_hp = int(monster.max_hp * (1 + 0.05 * (tier - 1)))
+    monster.hp = monster.max_hp
+    if tier % 2 == 1 and attack_bonus:
+        monster.attack_range = (monster.attack_range[0] + attack_bonus, monster.attack_range[1])
+
+
 # --- Game engine --------------------------------------------------------
 
 
 class Game:
-    def __init__(self, tier=1, mission=None):
+    # patrol ticks after which a prebattle that triggered no aggro turns
+    # into combat anyway; generated maps can keep both sides apart forever
+    PREBATTLE_TICKS = 100
+
+    def __init__(self, tier=1, mission=None, seed=None, map_size=None, map_options=None,
+                 prebattle_ticks=None):
         self.tier = tier
-        self.map = Map()
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        # private generator so battles are reproducible and independent
+        self.rng = random.Random(seed)
+        if map_size is None:
+            self.map = Map(rng=self.rng)
+        else:
+            # generated battlefield; options are passed to Map.generate
+            options = dict(map_options or {})
+            if "seed" not in options:
+                options["seed"] = self.rng.randrange(2 ** 32)
+            self.map = Map.generate(*map_size, **options)
         # heroes and monsters
-        self.heroes = [Warrior(), Mage()]
-        self.mission = mission or random.choice([
-            "capture_point",
-            "escort",
-            "survival",
-            "destroy_shrine",
-        ])
+        self.heroes = [t.build() for t in UNITS.heroes]
+        self.mission = mission or self.rng.choice(list(OBJECTIVES))
+        if self.mission not in OBJECTIVES:
+            raise ValueError(f"unknown mission {self.mission!r}")
+        self._load_objective()
         # mission specific setup
         self.objective_complete = False
         self.objective_failed = None
@@ -542,79 +1251,72 @@ class Game:
         self.survival_rounds = 0
         self.wave_interval = 3
         self.shrine = None
+        self.archetype = None
 
-        if self.mission == "escort":
-            # add a priest VIP and exit tile
-            self.vip = Priest()
-            self.heroes.append(self.vip)
-            self.exit_tile = (self.map.width - 1, self.map.height - 1)
-            tile = self.map.tile(*self.exit_tile)
-            tile["terrain"] = "exit"
-        if self.mission == "capture_point":
-            self.control_point = (self.map.width // 2, self.map.height // 2)
-            tile = self.map.tile(*self.control_point)
-            tile["terrain"] = "control_point"
-            self.objective_required = 3
-        if self.mission == "survival":
-            self.survival_rounds = 10
-            self.objective_required = self.survival_rounds
-        if self.mission == "destroy_shrine":
-            self.shrine = EnemyShrine(20)
-            # place shrine near enemy side
-            self.shrine.x = self.map.width - 2
-            self.shrine.y = self.map.height // 2
-            # make the shrine tile impassable so units stop adjacent
-            tile = self.map.tile(self.shrine.x, self.shrine.y)
-            tile["terrain"] = "enemy_shrine"
-            tile["passable"] = False
-            self.monsters = [self.shrine]
-        else:
-            self.monsters = self.generate_encounter()
+        self.objective.setup(self)
+        self.monsters = self.objective.encounter(self)
+        self._register_units()
+
+        for c in self.units.roster:
+            c.rng = self.rng
 
         # place units on the map
         for i, h in enumerate(self.heroes):
             h.x = i % 2
             h.y = i // 2
-        if self.mission != "destroy_shrine":
+        if self.objective.prebattle:
             for i, m in enumerate(self.monsters):
                 m.x = self.map.width - 1 - (i % 2)
                 m.y = i // 2
-                left = max(0, m.x - 4)
+                # patrol towards the heroes' side so large maps still engage
+                left = max(0, m.x - max(4, self.map.width - 4))
                 m.patrol_path = [(m.x, m.y), (left, m.y)]
+        self._index_units()
 
         self.round = 1
         self.taunt_target = None
-        self.arena = random.choice([
+        self.arena = self.rng.choice([
             "arena.ruins",
             "arena.forest",
             "arena.cave",
         ])
         self.phase = "prebattle"
         self.aggro_radius = 3
+        self.prebattle_ticks = self.PREBATTLE_TICKS if prebattle_ticks is None else prebattle_ticks
+        self.ticks = 0
         self._opp_tracker = {}
-        self._event_gen = self._events()
+        # where the event stream stands, see _advance
+        self._stage = "intro"
+        self._pending = deque()
+
+    def _load_objective(self):
+        self.objective = OBJECTIVES[self.mission]()
+        self._objective_handlers = self.objective.subscriptions()
+
+    def spawn(self, unit, x, y):
+        """Add a monster at ``(x, y)`` in the middle of a battle.
+
+        Whoever already took their turn this round is not affected, so
+        the newcomer acts from the next round on.
+        """
+        unit.rng = self.rng
+        unit.x, unit.y = x, y
+        self._occupy(unit)
+        self.monsters.append(unit)
+        self.units.add(unit, MONSTERS)
 
     # --- encounter generation ----------------------------------------
     def generate_encounter(self):
-        archetype = random.choice(["swarm", "elite", "double"])
+        """Monsters of an encounter drawn from the weighted tables of the
+        unit file; only the units drawn are built."""
+        encounter = self.rng.choice(UNITS.encounters)
+        self.archetype = encounter.name
         mons = []
-        if archetype == "swarm":
-            mons = [Goblin(), Goblin(), Archer()]
-            if random.random() < 0.5:
-                mons.append(Shaman())
-        elif archetype == "elite":
-            front = random.choice([Orc(), Troll()])
-            support = random.choice([Priest(), Shaman()])
-            mons = [front, support]
-        else:  # double wall
-            mons = [Orc(), Troll(), random.choice([Shaman(), Priest()])]
-
-        hp_scale = 1 + 0.05 * (self.tier - 1)
-        for m in mons:
-            m.max_hp = int(m.max_hp * hp_scale)
-            m.hp = m.max_hp
-            if self.tier % 2 == 1 and isinstance(m, (Goblin, Orc, Archer)):
-                m.attack_range = (m.attack_range[0] + 1, m.attack_range[1])
+        for picks, chance in encounter.slots:
+            if chance < 1 and self.rng.random() >= chance:
+                continue
+            template = picks[0] if len(picks) == 1 else self.rng.choice(picks)
+            mons.append(template.build(self.tier))
         return mons
 
     # --- util ----------------------------------------------------------
@@ -624,13 +1326,7 @@ class Game:
             return None
         # mission specific priority for destroying shrine
         if self.mission == "destroy_shrine" and self.shrine and self.shrine in living:
-            blocked = {
-                (c.x, c.y)
-                for c in self.heroes + self.monsters
-                if c.is_alive() and c is not actor
-            }
-            path = self.find_path((actor.x, actor.y), (self.shrine.x, self.shrine.y), blocked)
-            if path:
+            if self.path_length((actor.x, actor.y), (self.shrine.x, self.shrine.y)) is not None:
                 return self.shrine
             # shrine unreachable – focus blocker
             others = [e for e in living if e is not self.shrine]
@@ -639,7 +1335,7 @@ class Game:
             return self.shrine
         if not ignore_taunt and self.taunt_target and self.taunt_target in living:
             return self.taunt_target
-        return random.choice(living)
+        return self.rng.choice(living)
 
     def distance(self, a, b):
         return abs(a.x - b.x) + abs(a.y - b.y)
@@ -648,43 +1344,220 @@ class Game:
         return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
     def line_of_sight(self, a, b):
-        if a.x == b.x:
-            step = 1 if b.y > a.y else -1
-            for y in range(a.y + step, b.y, step):
-                if self.map.tile(a.x, y)["terrain"] == "obstacle":
-                    return False
-        elif a.y == b.y:
-            step = 1 if b.x > a.x else -1
-            for x in range(a.x + step, b.x, step):
-                if self.map.tile(x, a.y)["terrain"] == "obstacle":
-                    return False
-        return True
+        return self.map.line_of_sight(a.x, a.y, b.x, b.y)
+
+    def blocked_shot(self, actor, target, events):
+        """Report that ``actor`` cannot see ``target`` and return ``events``.
+
+        An actor that has not moved yet this turn steps towards the
+        target to work around the obstacle.
+        """
+        moved = bool(events)
+        events.append({"type": "los_blocked", "attacker_id": actor.name, "target_id": target.name})
+        if not moved:
+            events.extend(self.move_unit_towards(actor, target))
+        return events
 
-    def find_path(self, start, goal, blocked):
-        queue = deque([start])
-        came = {start: None}
+    def find_path(self, start, goal, blocked=None, mover=None):
+        """Shortest path from ``start`` to ``goal`` as a list of tiles.
+
+        Tiles in ``blocked`` are avoided; without it every tile held by a
+        living unit other than ``mover`` is. The goal itself is always
+        allowed. Occupancy-based queries walk a distance field shared by
+        every unit heading for the same goal and return exactly the path
+        ``find_path_bfs`` would.
+        """
+        if blocked is not None or (mover is not None and (mover.x, mover.y) != start):
+            return self.find_path_bfs(start, goal, blocked, mover)
+        width = self.map.width
+        adjacent = self.map.adjacent
+        origin = start[1] * width + start[0]
+        target = goal[1] * width + goal[0]
+        if origin == target:
+            return [start]
+        dist = self.distance_field(goal)
+        level = self._entry_distance(origin, dist)
+        if level is None:
+            return None
+        # breadth-first over the shortest-path DAG only; visiting it in the
+        # same order as a plain BFS reproduces that BFS's tie-breaking
+        came = {origin: None}
+        frontier = [origin]
+        while target not in came:
+            level -= 1
+            nxt = []
+            for cur in frontier:
+                for n in adjacent[cur]:
+                    if dist[n] == level and n not in came:
+                        came[n] = cur
+                        nxt.append(n)
+            frontier = nxt
+        path = [target]
+        while path[-1] != origin:
+            path.append(came[path[-1]])
+        path.reverse()
+        return [(i % width, i // width) for i in path]
+
+    def path_length(self, start, goal):
+        """Steps on the shortest free path from ``start`` to ``goal`` or None."""
+        if start == goal:
+            return 0
+        origin = start[1] * self.map.width + start[0]
+        return self._entry_distance(origin, self.distance_field(goal))
+
+    def _entry_distance(self, origin, dist):
+        best = None
+        for n in self.map.adjacent[origin]:
+            d = dist[n]
+            if d >= 0 and (best is None or d < best):
+                best = d
+        return None if best is None else best + 1
+
+    def distance_field(self, goal):
+        """Steps from every tile to ``goal`` around obstacles and units.
+
+        Tiles that cannot reach the goal hold -1. Fields are cached per
+        goal until a unit moves, dies or is revived.
+        """
+        version = (self._occupancy_version, self.units.version)
+        if self._fields_version != version:
+            self._fields.clear()
+            self._open_tiles = None
+            self._fields_version = version
+        width = self.map.width
+        target = goal[1] * width + goal[0]
+        dist = self._fields.get(target)
+        if dist is not None:
+            return dist
+        open_tiles = self._open_tiles
+        if open_tiles is None:
+            open_tiles = bytearray(self.map.passable)
+            for i, units in self._occupancy.items():
+                if any(u.hp > 0 for u in units):
+                    open_tiles[i] = 0
+            self._open_tiles = open_tiles
+        adjacent = self.map.adjacent
+        dist = [-1] * len(open_tiles)
+        dist[target] = 0
+        queue = deque([target])
+        while queue:
+            cur = queue.popleft()
+            d = dist[cur] + 1
+            for n in adjacent[cur]:
+                if dist[n] < 0 and open_tiles[n]:
+                    dist[n] = d
+                    queue.append(n)
+        self._fields[target] = dist
+        return dist
+
+    def find_path_bfs(self, start, goal, blocked=None, mover=None):
+        """Reference single-query BFS behind ``find_path``."""
+        width = self.map.width
+        passable = self.map.passable
+        adjacent = self.map.adjacent
+        origin = start[1] * width + start[0]
+        target = goal[1] * width + goal[0]
+        if blocked is not None:
+            blocked = {x + y * width for x, y in blocked}
+        occupancy = self._occupancy
+        queue = deque([origin])
+        came = {origin: None}
         while queue:
             cur = queue.popleft()
-            if cur == goal:
+            if cur == target:
                 break
-            for nx, ny in self.map.neighbors(*cur):
-                if (nx, ny) in blocked and (nx, ny) != goal:
+            for n in adjacent[cur]:
+                if n in came:
                     continue
-                if not self.map.tile(nx, ny)["passable"] and (nx, ny) != goal:
-                    continue
-                if (nx, ny) not in came:
-                    came[(nx, ny)] = cur
-                    queue.append((nx, ny))
-        if goal not in came:
+                if n != target:
+                    if not passable[n]:
+                        continue
+                    if blocked is not None:
+                        if n in blocked:
+                            continue
+                    elif n in occupancy and any(u is not mover and u.hp > 0 for u in occupancy[n]):
+                        continue
+                came[n] = cur
+                queue.append(n)
+        if target not in came:
             return None
-        path = [goal]
-        while path[-1] != start:
+        path = [target]
+        while path[-1] != origin:
             path.append(came[path[-1]])
         path.reverse()
-        return path
+        return [(i % width, i // width) for i in path]
+
+    # --- occupancy -------------------------------------------------------
+    def _index_units(self):
+        # tile index -> units standing there; dead units are ignored by
+        # queries and dropped once someone else moves onto the tile
+        self._occupancy = {}
+        # bumped whenever a unit enters or leaves a tile; deaths and
+        # revivals bump ``units.version`` instead
+        self._occupancy_version = 0
+        self._fields = {}
+        self._fields_version = -1
+        self._open_tiles = None
+        for c in self.units.roster:
+            self._occupy(c)
+        self.units.threat = {HEROES: ThreatMap(self.map), MONSTERS: ThreatMap(self.map)}
+        for c in self.units.living():
+            self.units.threat[c.side].add(c)
+
+    def _register_units(self):
+        self.units = UnitRegistry()
+        for c in self.heroes:
+            self.units.add(c, HEROES)
+        for c in self.monsters:
+            self.units.add(c, MONSTERS)
+
+    def _occupy(self, unit):
+        i = unit.y * self.map.width + unit.x
+        self._occupancy_version += 1
+        units = self._occupancy.get(i)
+        if units is None:
+            self._occupancy[i] = [unit]
+        else:
+            units[:] = [u for u in units if u.is_alive()]
+            units.append(unit)
+
+    def _vacate(self, unit):
+        i = unit.y * self.map.width + unit.x
+        units = self._occupancy.get(i)
+        if units and unit in units:
+            self._occupancy_version += 1
+            units.remove(unit)
+            if not units:
+                del self._occupancy[i]
+
+    def _relocate(self, unit, x, y):
+        self._vacate(unit)
+        threat = self.units.threat[unit.side] if unit.hp > 0 else None
+        if threat is not None:
+            threat.remove(unit)
+        unit.x, unit.y = x, y
+        if threat is not None:
+            threat.add(unit)
+        self._occupy(unit)
+
+    def unit_at(self, x, y):
+        """Living unit standing on ``(x, y)``, if any."""
+        for u in self._occupancy.get(y * self.map.width + x, ()):
+            if u.is_alive():
+                return u
+        return None
+
+    def is_occupied(self, x, y, exclude=None):
+        for u in self._occupancy.get(y * self.map.width + x, ()):
+            if u is not exclude and u.is_alive():
+                return True
+        return False
 
     def _check_zoc(self, mover, from_pos, events, tracker):
-        enemies = self.monsters if mover in self.heroes else self.heroes
+        zoc = self.units.threat[OPPONENT[mover.side]].melee
+        if not zoc[from_pos[1] * self.map.width + from_pos[0]]:
+            return
+        enemies = self.monsters if mover.side == HEROES else self.heroes
         for e in enemies:
             if not e.is_alive() or e.range > 1:
                 continue
@@ -692,7 +1565,7 @@ class Game:
                 if e.name in tracker:
                     continue
                 tracker.add(e.name)
-                dmg = random.randint(*e.attack_range)
+                dmg = self.rng.randint(*e.attack_range)
                 dmg = int(dmg * e._damage_mod() * 0.5)
                 events.append({
                     "type": "opportunity_hit",
@@ -700,92 +1573,60 @@ class Game:
                     "defender_id": mover.name,
                     "dmg": dmg,
                 })
+                taken = mover.taken
                 events.extend(mover.take_damage(dmg))
+                e.dealt += mover.taken - taken
 
     def move_unit_towards(self, unit, target):
         start = (unit.x, unit.y)
-        blocked = {(c.x, c.y) for c in self.heroes + self.monsters if c.is_alive() and c is not unit}
-        path = self.find_path(start, (target.x, target.y), blocked)
+        path = self.find_path(start, (target.x, target.y), mover=unit)
         if not path or len(path) <= 1:
             return []
         # stop before the target tile so adjacent attackers can strike
         path = path[:-1]
-        path = path[1:1 + unit.move_points]
+        return self._walk(unit, path[1:1 + unit.move_points])
+
+    def move_unit_to(self, unit, dest):
+        start = (unit.x, unit.y)
+        path = self.find_path(start, dest, mover=unit)
+        if not path or len(path) < 2:
+            return []
+        return self._walk(unit, path[1:2])
+
+    def _walk(self, unit, path):
+        """Move ``unit`` tile by tile along ``path`` applying terrain effects."""
+        if not path:
+            return []
+        start = (unit.x, unit.y)
         steps = []
         events = []
         tracker = set()
         for step in path:
             from_pos = (unit.x, unit.y)
-            tile_from = self.map.tile(*from_pos)
-            events.append({"type": "leave_tile", "unit_id": unit.name, "tile": tile_from})
+            events.append({"type": "leave_tile", "unit_id": unit.name, "tile": self.map.tile(*from_pos)})
             self._check_zoc(unit, from_pos, events, tracker)
-            unit.x, unit.y = step
-            steps.append({"x": step[0], "y": step[1]})
-            tile = self.map.tile(*step)
+            self._relocate(unit, *step)
+            terrain = self.map.terrain[self.map.index(*step)]
             applied = None
-            if tile["terrain"] == "hazard_poison":
+            if terrain == HAZARD_POISON:
                 unit.poison = 1
                 unit.poison_turns = 2
                 applied = {"status": "poison", "turns": 2}
                 events.append({"type": "status", "status": "poison", "target": unit.name, "turns": 2})
-            elif tile["terrain"] == "shrine" and (step in self.map.shrines):
+            elif terrain == SHRINE and (step in self.map.shrines):
                 heal = min(3, unit.max_hp - unit.hp)
-                unit.hp += heal
+                unit._restore(heal)
                 unit.shield += 2
                 self.map.shrines.remove(step)
-                tile["terrain"] = "plain"
+                self.map.set_terrain(*step, "plain")
                 applied = {"status": "shrine", "heal": heal, "shield": 2}
                 if heal:
                     events.append({"type": "heal", "actor": unit.name, "amount": heal, "hp": unit.hp})
                 events.append({"type": "status", "status": "shield", "target": unit.name, "amount": 2, "remaining": unit.shield})
-            events.append({"type": "enter_tile", "unit_id": unit.name, "tile": tile, "applied_status": applied})
-            events.extend(self._objective_on_move(unit))
-        if steps:
-            move_ev = {
-                "type": "move",
-                "unit_id": unit.name,
-                "from": {"x": start[0], "y": start[1]},
-                "to": {"x": unit.x, "y": unit.y},
-                "path": steps,
-            }
-            return [move_ev] + events
-        return []
-
-    def move_unit_to(self, unit, dest):
-        start = (unit.x, unit.y)
-        blocked = {(c.x, c.y) for c in self.heroes + self.monsters if c.is_alive() and c is not unit}
-        path = self.find_path(start, dest, blocked)
-        if not path or len(path) < 2:
-            return []
-        step = path[1]
-        steps = []
-        events = []
-        tracker = set()
-        from_pos = start
-        tile_from = self.map.tile(*from_pos)
-        events.append({"type": "leave_tile", "unit_id": unit.name, "tile": tile_from})
-        self._check_zoc(unit, from_pos, events, tracker)
-        unit.x, unit.y = step
-        steps.append({"x": step[0], "y": step[1]})
-        tile = self.map.tile(*step)
-        applied = None
-        if tile["terrain"] == "hazard_poison":
-            unit.poison = 1
-            unit.poison_turns = 2
-            applied = {"status": "poison", "turns": 2}
-            events.append({"type": "status", "status": "poison", "target": unit.name, "turns": 2})
-        elif tile["terrain"] == "shrine" and (step in self.map.shrines):
-            heal = min(3, unit.max_hp - unit.hp)
-            unit.hp += heal
-            unit.shield += 2
-            self.map.shrines.remove(step)
-            tile["terrain"] = "plain"
-            applied = {"status": "shrine", "heal": heal, "shield": 2}
-            if heal:
-                events.append({"type": "heal", "actor": unit.name, "amount": heal, "hp": unit.hp})
-            events.append({"type": "status", "status": "shield", "target": unit.name, "amount": 2, "remaining": unit.shield})
-        events.append({"type": "enter_tile", "unit_id": unit.name, "tile": tile, "applied_status": applied})
-        events.extend(self._objective_on_move(unit))
+            steps.append({"x": step[0], "y": step[1]})
+            events.append({"type": "enter_tile", "unit_id": unit.name, "tile": self.map.tile(*step), "applied_status": applied})
+            if self.objective.on_move is not None:
+                events.extend(self.objective.on_move(self, unit))
         move_ev = {
             "type": "move",
             "unit_id": unit.name,
@@ -796,12 +1637,16 @@ class Game:
         return [move_ev] + events
 
     def move_unit_away(self, unit, enemies):
+        near = self._threat_near(unit, enemies)
         candidates = []
         for nx, ny in self.map.neighbors(unit.x, unit.y):
-            tile = self.map.tile(nx, ny)
-            if not tile["passable"]:
+            i = self.map.index(nx, ny)
+            if not self.map.passable[i]:
+                continue
+            if near is not None and near[i]:
+                # an enemy is next to the tile: never a way out
                 continue
-            if any(c.x == nx and c.y == ny and c.is_alive() for c in self.heroes + self.monsters):
+            if self.is_occupied(nx, ny):
                 continue
             dist = min(self.distance_coords((nx, ny), (e.x, e.y)) for e in enemies if e.is_alive())
             candidates.append(((nx, ny), dist))
@@ -814,21 +1659,48 @@ class Game:
     def kite(self, unit, enemies):
         if unit.range <= 1:
             return []
-        if all(self.distance(unit, e) > 1 for e in enemies if e.is_alive()):
+        near = self._threat_near(unit, enemies)
+        if near is not None:
+            if not near[unit.y * self.map.width + unit.x]:
+                return []
+        elif all(self.distance(unit, e) > 1 for e in enemies if e.is_alive()):
             return []
         return self.move_unit_away(unit, enemies)
 
+    def _threat_near(self, unit, enemies):
+        # the threat map stands for exactly the living opponents, which is
+        # what take_turn is given; any other list is scanned
+        side = OPPONENT.get(unit.side)
+        if side is not None and enemies is self.units.living(side):
+            return self.units.threat[side].near
+        return None
+
     def check_aggro(self):
+        """First hero and monster, in roster order, within ``aggro_radius``
+        and sight of each other."""
+        # zones are cached per tile, so patrols soon only do lookups
+        sight_zone = self.map.sight_zone
+        radius = self.aggro_radius
+        zones = [(m, sight_zone(m.x, m.y, radius)) for m in self.monsters if m.hp > 0]
+        width = self.map.width
         for h in self.heroes:
-            if not h.is_alive():
-                continue
-            for m in self.monsters:
-                if not m.is_alive():
-                    continue
-                if self.distance(h, m) <= self.aggro_radius and self.line_of_sight(h, m):
-                    return h, m
+            if h.hp > 0:
+                i = h.y * width + h.x
+                for m, zone in zones:
+                    if i in zone:
+                        return h, m
         return None, None
 
+    def _patrol(self):
+        """Move every patrolling unit one step; ``(unit, move events)`` pairs."""
+        self.ticks += 1
+        moves = []
+        for unit in self.units.roster:
+            if unit.patrol_path or unit.wander_area:
+                dest = self.patrol_step(unit)
+                moves.append((unit, self.move_unit_to(unit, dest)))
+        return moves
+
     def patrol_step(self, unit):
         if unit.patrol_path:
             dest = unit.patrol_path[unit._patrol_index]
@@ -842,13 +1714,13 @@ class Game:
             for nx, ny in self.map.neighbors(unit.x, unit.y):
                 if not (x1 <= nx <= x2 and y1 <= ny <= y2):
                     continue
-                if not self.map.tile(nx, ny)["passable"]:
+                if not self.map.passable[self.map.index(nx, ny)]:
                     continue
-                if any(c.x == nx and c.y == ny and c.is_alive() for c in self.heroes + self.monsters):
+                if self.is_occupied(nx, ny):
                     continue
                 opts.append((nx, ny))
             if opts:
-                return random.choice(opts)
+                return self.rng.choice(opts)
         return unit.x, unit.y
 
     def _char_info(self, c):
@@ -864,206 +1736,133 @@ class Game:
     # --- objective system ---------------------------------------------
 
     def _objective_init_event(self):
-        data = {}
-        if self.mission == "capture_point" and self.control_point:
-            data = {
-                "tiles": [{"x": self.control_point[0], "y": self.control_point[1]}],
-                "required": self.objective_required,
-            }
-        elif self.mission == "escort" and self.vip and self.exit_tile:
-            data = {
-                "vip": self.vip.name,
-                "exit": {"x": self.exit_tile[0], "y": self.exit_tile[1]},
-            }
-        elif self.mission == "survival":
-            data = {"rounds": self.survival_rounds, "wave_interval": self.wave_interval}
-        elif self.mission == "destroy_shrine" and self.shrine:
-            data = {
-                "shrine": {
-                    "x": self.shrine.x,
-                    "y": self.shrine.y,
-                    "hp": self.shrine.hp,
-                }
-            }
-        return {"type": "objective_init", "mission": self.mission, "data": data}
-
-    def _objective_target_event(self):
-        if self.mission == "destroy_shrine" and self.shrine:
-            return {
-                "type": "objective_target",
-                "id": self.shrine.name,
-                "pos": {"x": self.shrine.x, "y": self.shrine.y},
-            }
-        return None
+        return {"type": "objective_init", "mission": self.mission, "data": self.objective.init_data(self)}
 
-    def _objective_on_move(self, unit):
-        events = []
-        if self.mission == "escort" and self.vip and unit is self.vip:
-            if (unit.x, unit.y) == self.exit_tile:
-                self.objective_complete = True
-                events.append({"type": "objective_complete", "mission": self.mission})
-        return events
+    def _objective_round_end(self):
+        on_round_end = self.objective.on_round_end
+        return on_round_end(self) if on_round_end is not None else []
 
-    def _objective_process_event(self, ev):
-        if self.mission == "escort" and ev.get("type") == "death" and ev.get("target") == (self.vip.name if self.vip else None):
-            self.objective_failed = True
-            return [{"type": "objective_fail", "mission": self.mission}]
-        if self.mission == "destroy_shrine" and self.shrine:
-            if ev.get("type") == "damage" and ev.get("target") == self.shrine.name:
-                progress = self.shrine.max_hp - self.shrine.hp
-                return [{
-                    "type": "objective_progress",
-                    "mission": self.mission,
-                    "progress": progress,
-                    "required": self.shrine.max_hp,
-                }]
-            if ev.get("type") == "death" and ev.get("target") == self.shrine.name:
-                self.objective_complete = True
-                return [{"type": "objective_complete", "mission": self.mission}]
-        return []
+    # --- event stream --------------------------------------------------
+    # The battle advances one chunk at a time (the opening, one prebattle
+    # patrol tick, one whole round) and queues that chunk's events. Between
+    # chunks the whole state lives in plain attributes, so the game can be
+    # snapshotted while events are still pending.
+    def _advance(self):
+        """Queue the next chunk of events; False once the battle is over."""
+        if self._stage == "intro":
+            self._pending.extend(self._intro())
+        elif self._stage == "prebattle":
+            self._pending.extend(self._patrol_tick())
+        elif self._stage == "combat":
+            if self.winner():
+                self._pending.append({"type": "end", "winner": self.winner()})
+                self._stage = "over"
+            else:
+                self._pending.extend(self.step())
+        else:
+            return False
+        return True
 
-    def _objective_round_end(self):
+    def _intro(self):
+        events = [
+            {
+                "type": "map_init",
+                "width": self.map.width,
+                "height": self.map.height,
+                "tiles": self.map.tile_list(),
+            },
+            {
+                "type": "start",
+                "arena": self.arena,
+                "heroes": [self._char_info(c) for c in self.heroes],
+                "monsters": [self._char_info(c) for c in self.monsters],
+            },
+            self._objective_init_event(),
+        ]
+        target_ev = self.objective.target_event(self)
+        if target_ev:
+            events.append(target_ev)
+        if not self.objective.prebattle:
+            self.phase = "combat"
+            events.append({"type": "phase_change", "value": "combat"})
+            events.extend(self._begin_combat())
+        else:
+            events.append({"type": "phase_change", "value": "prebattle"})
+            self._stage = "prebattle"
+        return events
+
+    def _patrol_tick(self):
         events = []
-        if self.mission == "capture_point" and self.control_point:
-            holder = None
-            for h in self.heroes:
-                if h.is_alive() and (h.x, h.y) == self.control_point:
-                    holder = h
-                    break
-            occupied_by_enemy = any(
-                m.is_alive() and (m.x, m.y) == self.control_point for m in self.monsters
-            )
-            if holder and not occupied_by_enemy:
-                self.objective_progress += 1
+        for unit, move_events in self._patrol():
+            if move_events:
+                mv = move_events[0]
                 events.append({
-                    "type": "objective_progress",
-                    "mission": self.mission,
-                    "holder": holder.name,
-                    "progress": self.objective_progress,
-                    "required": self.objective_required,
+                    "type": "patrol_tick",
+                    "unit_id": unit.name,
+                    "from": mv["from"],
+                    "to": mv["to"],
                 })
-                if self.objective_progress >= self.objective_required:
-                    self.objective_complete = True
-                    events.append({"type": "objective_complete", "mission": self.mission})
-            elif self.objective_progress:
-                self.objective_progress = 0
-                events.append({
-                    "type": "objective_progress",
-                    "mission": self.mission,
-                    "progress": 0,
-                    "required": self.objective_required,
-                })
-        if self.mission == "survival":
-            self.objective_progress += 1
+        h, m = self.check_aggro()
+        if h:
             events.append({
-                "type": "objective_progress",
-                "mission": self.mission,
-                "progress": self.objective_progress,
-                "required": self.objective_required,
+                "type": "aggro_trigger",
+                "source_id": h.name,
+                "target_id": m.name,
+                "radius": self.aggro_radius,
             })
-            if self.objective_progress >= self.objective_required:
-                self.objective_complete = True
-                events.append({"type": "objective_complete", "mission": self.mission})
-            elif self.objective_progress % self.wave_interval == 0:
-                # spawn a simple goblin at enemy edge
-                g = Goblin()
-                g.x = self.map.width - 1
-                g.y = random.randrange(self.map.height)
-                self.monsters.append(g)
-                events.append({
-                    "type": "wave_spawn",
-                    "round": self.round,
-                    "monsters": [self._char_info(g)],
-                })
+        if h or self.ticks >= self.prebattle_ticks:
+            self.phase = "combat"
+            events.append({"type": "phase_change", "value": "combat"})
+            events.extend(self._begin_combat())
         return events
 
-    # --- event stream --------------------------------------------------
+    def _begin_combat(self):
+        self._stage = "combat"
+        return [
+            {"type": "status", "status": "regen", "target": c.name}
+            for c in self.units.roster if c.regen
+        ]
+
     def _events(self):
-        yield {
-            "type": "map_init",
-            "width": self.map.width,
-            "height": self.map.height,
-            "tiles": list(self.map.tiles.values()),
-        }
-        yield {
-            "type": "start",
-            "arena": self.arena,
-            "heroes": [self._char_info(c) for c in self.heroes],
-            "monsters": [self._char_info(c) for c in self.monsters],
-        }
-        yield self._objective_init_event()
-        target_ev = self._objective_target_event()
-        if target_ev:
-            yield target_ev
-        if self.mission == "destroy_shrine":
-            self.phase = "combat"
-            yield {"type": "phase_change", "value": "combat"}
-        else:
-            yield {"type": "phase_change", "value": "prebattle"}
-            while self.phase == "prebattle":
-                moved = False
-                for unit in self.heroes + self.monsters:
-                    if unit.patrol_path or unit.wander_area:
-                        dest = self.patrol_step(unit)
-                        move_events = self.move_unit_to(unit, dest)
-                        if move_events:
-                            moved = True
-                            mv = move_events[0]
-                            yield {
-                                "type": "patrol_tick",
-                                "unit_id": unit.name,
-                                "from": mv["from"],
-                                "to": mv["to"],
-                            }
-                h, m = self.check_aggro()
-                if h:
-                    yield {
-                        "type": "aggro_trigger",
-                        "source_id": h.name,
-                        "target_id": m.name,
-                        "radius": self.aggro_radius,
-                    }
-                    self.phase = "combat"
-                    yield {"type": "phase_change", "value": "combat"}
-                    break
-        for c in self.heroes + self.monsters:
-            if c.regen:
-                yield {"type": "status", "status": "regen", "target": c.name}
-        while not self.winner():
-            yield from self.step()
-        yield {"type": "end", "winner": self.winner()}
+        """Iterate over the rest of the event stream."""
+        while True:
+            ev = self.next_event()
+            if ev is None:
+                return
+            yield ev
 
     def step(self):
-        order = sorted(
-            [c for c in self.heroes + self.monsters if c.is_alive()],
-            key=lambda c: c.speed,
-            reverse=True,
-        )
+        order = self._turn_order()
         yield {
             "type": "round",
             "round": self.round,
             "order": [c.name for c in order],
         }
+        # event type -> objective handler; unsubscribed types cost a lookup
+        handlers = self._objective_handlers
         for actor in order:
-            side = self.heroes if actor in self.heroes else self.monsters
+            side = self.heroes if actor.side == HEROES else self.monsters
             enemies = self.monsters if side is self.heroes else self.heroes
             for ev in actor.begin_turn():
                 yield ev
-                for oev in self._objective_process_event(ev):
-                    yield oev
+                handler = handlers.get(ev["type"])
+                if handler is not None:
+                    yield from handler(self, ev)
             if not actor.is_alive() or not enemies:
                 continue
-            events = actor.take_turn(side, [e for e in enemies if e.is_alive()], self)
+            events = actor.take_turn(side, self.units.living(OPPONENT[actor.side]), self)
             for ev in events:
                 yield ev
-                for oev in self._objective_process_event(ev):
-                    yield oev
+                handler = handlers.get(ev["type"])
+                if handler is not None:
+                    yield from handler(self, ev)
                 if self.winner():
                     return
             for ev in actor.end_turn():
                 yield ev
-                for oev in self._objective_process_event(ev):
-                    yield oev
+                handler = handlers.get(ev["type"])
+                if handler is not None:
+                    yield from handler(self, ev)
                 if self.winner():
                     return
             if actor is self.taunt_target and actor is not side:
@@ -1074,20 +1873,141 @@ class Game:
             if self.winner():
                 return
 
+    def _turn_order(self):
+        """Living units fastest first, ties in roster order.
+
+        Sorted when the round starts: speed changes during a round, such
+        as a shaman's frenzy, take effect from the next one.
+        """
+        return sorted(self.units.living(), key=lambda c: c.speed, reverse=True)
+
     def winner(self):
         if self.objective_complete:
-            return "Heroes"
+            return HEROES
         if self.objective_failed:
-            return "Monsters"
-        if all(not m.is_alive() for m in self.monsters):
-            return "Heroes"
-        if all(not h.is_alive() for h in self.heroes):
-            return "Monsters"
+            return MONSTERS
+        alive = self.units.alive
+        if not alive[MONSTERS]:
+            return HEROES
+        if not alive[HEROES]:
+            return MONSTERS
         return None
 
     def next_event(self):
-        try:
-            return next(self._event_gen)
-        except StopIteration:
-            return None
+        while not self._pending:
+            if not self._advance():
+                return None
+        return self._pending.popleft()
+
+    def resolve(self):
+        """Play the rest of the battle and return :meth:`result`."""
+        for _ in self._events():
+            pass
+        return self.result()
+
+    def result(self):
+        """Outcome and per-unit statistics of the battle so far."""
+        return {
+            "winner": self.winner(),
+            "rounds": self.round,
+            "mission": self.mission,
+            "archetype": self.archetype,
+            "units": [
+                {
+                    "name": c.name,
+                    "class": type(c).__name__,
+                    "side": c.side,
+                    "hp": c.hp,
+                    "dealt": c.dealt,
+                    "taken": c.taken,
+                }
+                for c in self.units.roster
+            ],
+        }
+
+    # --- snapshots -----------------------------------------------------
+    def snapshot(self):
+        """JSON-ready copy of the whole battle state.
+
+        Covers the map, every unit, objective progress, round, phase, the
+        RNG state and events computed but not yet delivered, so
+        :meth:`from_snapshot` continues exactly where this game stands.
+        """
+        units = self.units.roster
 
+        def ref(unit):
+            return None if unit is None else unit.uid
+
+        version, state, gauss = self.rng.getstate()
+        return {
+            "v": SNAPSHOT_VERSION,
+            "seed": self.seed,
+            "tier": self.tier,
+            "mission": self.mission,
+            "archetype": self.archetype,
+            "arena": self.arena,
+            "phase": self.phase,
+            "stage": self._stage,
+            "round": self.round,
+            "aggro_radius": self.aggro_radius,
+            "prebattle_ticks": self.prebattle_ticks,
+            "ticks": self.ticks,
+            "rng": [version, list(state), gauss],
+            "map": [self.map.width, self.map.height, self.map.terrain.hex(), self.map.passable.hex()],
+            "heroes": len(self.heroes),
+            "units": [[type(u).__name__] + [getattr(u, f) for f in UNIT_FIELDS] for u in units],
+            "objective": [
+                self.objective_complete, self.objective_failed, self.objective_progress,
+                self.objective_required, self.control_point, self.exit_tile,
+                self.survival_rounds, self.wave_interval,
+            ],
+            "vip": ref(self.vip),
+            "shrine": ref(self.shrine),
+            "taunt": ref(self.taunt_target),
+            "pending": list(self._pending),
+        }
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """Rebuild a game from :meth:`snapshot` output."""
+        if data["v"] != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {data['v']}")
+        game = cls.__new__(cls)
+        for key in ("seed", "tier", "mission", "archetype", "arena", "phase", "round", "aggro_radius",
+                    "prebattle_ticks", "ticks"):
+            setattr(game, key, data[key])
+        version, state, gauss = data["rng"]
+        game.rng = random.Random()
+        game.rng.setstate((version, tuple(state), gauss))
+        width, height, terrain, passable = data["map"]
+        game.map = Map(width, height, layout=bytes.fromhex(terrain))
+        game.map.passable[:] = bytes.fromhex(passable)
+        units = []
+        for name, *values in data["units"]:
+            unit = UNIT_CLASSES[name].__new__(UNIT_CLASSES[name])
+            for field, value in zip(UNIT_FIELDS, values):
+                setattr(unit, field, value)
+            # JSON turned the tuples into lists
+            unit.attack_range = tuple(unit.attack_range)
+            unit.patrol_path = [tuple(p) for p in unit.patrol_path]
+            if unit.wander_area is not None:
+                unit.wander_area = tuple(unit.wander_area)
+            unit.rng = game.rng
+            units.append(unit)
+        game.heroes = units[:data["heroes"]]
+        game.monsters = units[data["heroes"]:]
+        (game.objective_complete, game.objective_failed, game.objective_progress,
+         game.objective_required, control_point, exit_tile,
+         game.survival_rounds, game.wave_interval) = data["objective"]
+        game.control_point = tuple(control_point) if control_point else None
+        game.exit_tile = tuple(exit_tile) if exit_tile else None
+        game.vip, game.shrine, game.taunt_target = (
+            None if i is None else units[i] for i in (data["vip"], data["shrine"], data["taunt"])
+        )
+        game._load_objective()
+        game._register_units()
+        game._index_units()
+        game._opp_tracker = {}
+        game._stage = data["stage"]
+        game._pending = deque(data["pending"])
+        return game
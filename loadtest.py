@@ -0,0 +1,134 @@
+"""Concurrent-client load test for the HTTP servers.
+
+Every simulated client starts a run and then long-polls ``/next`` in
+batches at a given playback speed until the battle ends, then starts the
+next one. Latencies include the time the server parks a long poll to
+pace playback. Point it at the Flask or the ASGI server to compare them::
+
+    MAX_SESSIONS=5000 python server.py   # or: ... uvicorn asgi:app --port 5000
+    python loadtest.py --clients 1000 --duration 30
+
+Only the standard library is used; each request opens its own connection.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(host, port, target, timeout):
+    """GET ``target`` and return the decoded JSON body."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    if status != 200:
+        raise RuntimeError(f'HTTP {status}')
+    if b'chunked' in head.lower():
+        body = _unchunk(body)
+    return json.loads(body)
+
+
+def _unchunk(body):
+    out = b''
+    while body:
+        size, _, rest = body.partition(b'\r\n')
+        size = int(size, 16)
+        if not size:
+            break
+        out += rest[:size]
+        body = rest[size + 2:]
+    return out
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.battles = 0
+        self.events = 0
+
+    def report(self, elapsed, clients):
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return lat[min(int(p * len(lat)), len(lat) - 1)] * 1000 if lat else 0.0
+
+        return {
+            'clients': clients,
+            'seconds': round(elapsed, 1),
+            'requests': len(lat),
+            'requests_per_s': round(len(lat) / elapsed, 1),
+            'events_per_s': round(self.events / elapsed, 1),
+            'battles': self.battles,
+            'errors': self.errors,
+            'p50_ms': round(pct(0.50), 1),
+            'p99_ms': round(pct(0.99), 1),
+        }
+
+
+async def client(host, port, args, stats, deadline):
+    run_id = None
+    while time.monotonic() < deadline:
+        if run_id:
+            target = f'/next?runId={run_id}&batch={args.batch}&wait={args.wait}&speed={args.speed}'
+        else:
+            target = '/start'
+        t0 = time.monotonic()
+        try:
+            data = await fetch(host, port, target, args.timeout)
+        except (OSError, RuntimeError, ValueError, asyncio.TimeoutError):
+            stats.errors += 1
+            run_id = None
+            await asyncio.sleep(0.1)
+            continue
+        stats.latencies.append(time.monotonic() - t0)
+        if data is None:
+            # the run was evicted or expired
+            stats.errors += 1
+            run_id = None
+        elif run_id:
+            stats.events += len(data['events'])
+            if data['done']:
+                stats.battles += 1
+                run_id = None
+        else:
+            stats.events += 1
+            run_id = data['runId']
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    await asyncio.gather(*(
+        client(url.hostname, url.port or 80, args, stats, deadline) for _ in range(args.clients)
+    ))
+    return stats.report(time.monotonic() - started, args.clients)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--batch', type=int, default=20)
+    parser.add_argument('--wait', type=float, default=5.0)
+    parser.add_argument('--speed', type=float, default=20.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
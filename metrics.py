@@ -0,0 +1,199 @@
+"""Optional hot-path instrumentation in Prometheus text format.
+
+Nothing is measured until :func:`enable` wraps the engine's hot methods
+with timers; :func:`disable` puts the originals back, so a server running
+without instrumentation pays nothing for it. Timings are inclusive: a
+round includes the ``find_path`` and ``take_turn`` calls made during it.
+"""
+
+import functools
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from engine import Character, Game, Objective
+
+# histogram bucket bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+GAME_METHODS = ("find_path", "_check_zoc")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class Metrics:
+    """Call counters, cumulative times and latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.histograms = {}
+
+    def record(self, fn, elapsed, unit=""):
+        key = (fn, unit)
+        with self._lock:
+            entry = self.calls.get(key)
+            if entry is None:
+                entry = self.calls[key] = [0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def observe(self, name, value, label=""):
+        key = (name, label)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.histograms.clear()
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of everything recorded so far.
+
+        ``gauges`` maps extra metric names to current values.
+        """
+        with self._lock:
+            calls = sorted(self.calls.items())
+            histograms = sorted(
+                (key, list(h.counts), h.total, h.n) for key, h in self.histograms.items()
+            )
+        lines = [
+            "# HELP rpg_calls_total Calls of instrumented engine methods.",
+            "# TYPE rpg_calls_total counter",
+        ]
+        lines += [f"rpg_calls_total{_labels(fn, unit)} {n}" for (fn, unit), (n, _) in calls]
+        lines += [
+            "# HELP rpg_call_seconds_total Cumulative time in instrumented engine methods.",
+            "# TYPE rpg_call_seconds_total counter",
+        ]
+        lines += [f"rpg_call_seconds_total{_labels(fn, unit)} {t:.9f}" for (fn, unit), (_, t) in calls]
+        seen = set()
+        for (name, label), counts, total, n in histograms:
+            metric = f"rpg_{name}_seconds"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {metric} histogram")
+            extra = f'endpoint="{label}",' if label else ""
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{extra}le="{bound}"}} {cumulative}')
+            suffix = f"{{{extra.rstrip(',')}}}" if extra else ""
+            lines.append(f"{metric}_sum{suffix} {total:.9f}")
+            lines.append(f"{metric}_count{suffix} {n}")
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE rpg_{name} gauge")
+            lines.append(f"rpg_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(fn, unit):
+    return f'{{fn="{fn}",unit="{unit}"}}' if unit else f'{{fn="{fn}"}}'
+
+
+registry = Metrics()
+
+
+# --- instrumentation -----------------------------------------------------
+
+_originals = {}
+
+
+def enabled():
+    return bool(_originals)
+
+
+def enable():
+    """Wrap the engine hot paths with timers (idempotent)."""
+    if _originals:
+        return
+    for name in GAME_METHODS:
+        _patch(Game, name, _timed(name, getattr(Game, name)))
+    _patch(Game, "step", _timed_step(Game.step))
+    for cls in _subclasses(Character):
+        if "take_turn" in vars(cls):
+            _patch(cls, "take_turn", _timed_turn(vars(cls)["take_turn"]))
+    # games subscribe to their objective when created, so only games
+    # started after this see the timed hooks
+    for cls in _subclasses(Objective):
+        hooks = [f"on_{etype}" for etype in cls.events] + ["on_move", "on_round_end"]
+        for name in hooks:
+            if callable(vars(cls).get(name)):
+                _patch(cls, name, _timed("objective", vars(cls)[name], cls.mission))
+
+
+def disable():
+    """Restore the original, untimed methods."""
+    for (cls, name), fn in _originals.items():
+        setattr(cls, name, fn)
+    _originals.clear()
+
+
+def _patch(cls, name, wrapper):
+    _originals[(cls, name)] = vars(cls)[name]
+    setattr(cls, name, wrapper)
+
+
+def _subclasses(cls):
+    yield cls
+    for sub in cls.__subclasses__():
+        yield from _subclasses(sub)
+
+
+def _timed(name, fn, unit=""):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            registry.record(name, perf_counter() - t0, unit)
+    return wrapper
+
+
+def _timed_turn(fn):
+    @functools.wraps(fn)
+    def take_turn(self, *args, **kwargs):
+        t0 = perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            registry.record("take_turn", perf_counter() - t0, type(self).__name__)
+    return take_turn
+
+
+def _timed_step(fn):
+    @functools.wraps(fn)
+    def step(self):
+        # only time spent inside the round counts, not the consumer's
+        gen = fn(self)
+        elapsed = 0.0
+        while True:
+            t0 = perf_counter()
+            try:
+                ev = next(gen)
+            except StopIteration:
+                break
+            finally:
+                elapsed += perf_counter() - t0
+            yield ev
+        registry.record("step", elapsed)
+        registry.observe("round", elapsed)
+    return step
@@ -0,0 +1,261 @@
+"""Compact wire encoding for battle events.
+
+Version 1 sends every event as a positional array ``[type, field, ...]``
+instead of a keyed object:
+
+* the event type and well-known strings (statuses, missions, winners,
+  phases, arenas) become indexes into :data:`EVENT_TYPES` / :data:`ENUMS`;
+* units are referred to by their index in a name table that both ends
+  build from ``start`` and ``wave_spawn`` events;
+* positions become tile indexes ``y * width + x`` and a full tile becomes
+  ``index * 16 + cell`` where ``cell = terrain_code * 2 + (not passable)``;
+* ``map_init`` carries the whole map as one string of hex cell digits.
+
+Trailing empty fields are dropped. Anything the schema does not describe
+is passed through unchanged, so the encoding is lossless:
+``Decoder().decode(Encoder(w).encode(ev)) == ev``.
+"""
+
+import json
+
+from engine import TERRAIN_CODES, TERRAINS
+
+VERSION = 1
+MEDIA_TYPE = "application/vnd.autorpg.compact+json"
+
+EVENT_TYPES = (
+    "map_init", "start", "objective_init", "objective_target", "phase_change",
+    "round", "move", "leave_tile", "enter_tile", "attack", "damage",
+    "objective_progress", "status", "end", "patrol_tick", "aggro_trigger",
+    "los_blocked", "opportunity_hit", "death", "shield", "heal",
+    "passive_tick", "objective_fail", "wave_spawn", "objective_complete",
+)
+
+ENUMS = (
+    "poison", "shield", "rage", "taunt", "fireball", "aim", "frenzy", "hex",
+    "regen", "shrine", "capture_point", "escort", "survival", "destroy_shrine",
+    "Heroes", "Monsters", "prebattle", "combat",
+    "arena.ruins", "arena.forest", "arena.cave",
+)
+
+# Field kinds: u unit, U unit list, p position, P position list, t tile,
+# e enum string, b bool, c character list, anything else is sent as is.
+# A trailing "?" marks keys that are left out of the event when empty.
+SCHEMA = {
+    "start": ("arena:e", "heroes:c", "monsters:c"),
+    "objective_init": ("mission:e", "data"),
+    "objective_target": ("id:u", "pos:p"),
+    "phase_change": ("value:e",),
+    "round": ("round", "order:U"),
+    "move": ("unit_id:u", "from:p", "to:p", "path:P"),
+    "leave_tile": ("unit_id:u", "tile:t"),
+    "enter_tile": ("unit_id:u", "tile:t", "applied_status"),
+    "attack": ("attacker:u", "target:u", "damage", "crit:b"),
+    "damage": ("target:u", "amount", "hp", "source:e?"),
+    "objective_progress": ("mission:e", "progress", "required", "holder:u?"),
+    "status": ("status:e", "target:u?", "turns?", "actor:u?", "amount?", "remaining?"),
+    "end": ("winner:e",),
+    "patrol_tick": ("unit_id:u", "from:p", "to:p"),
+    "aggro_trigger": ("source_id:u", "target_id:u", "radius"),
+    "los_blocked": ("attacker_id:u", "target_id:u"),
+    "opportunity_hit": ("attacker_id:u", "defender_id:u", "dmg"),
+    "death": ("target:u",),
+    "shield": ("target:u", "amount", "remaining"),
+    "heal": ("actor:u", "amount", "hp", "target:u?"),
+    "passive_tick": ("status:e", "target:u", "amount", "hp"),
+    "objective_fail": ("mission:e",),
+    "wave_spawn": ("round", "monsters:c"),
+    "objective_complete": ("mission:e",),
+}
+
+# keys added by the transport rather than the engine
+TRANSPORT_KEYS = {"runId"}
+
+
+def _fields(spec):
+    fields = []
+    for entry in spec:
+        optional = entry.endswith("?")
+        name, _, kind = entry.rstrip("?").partition(":")
+        fields.append((name, kind, optional))
+    return tuple(fields)
+
+
+_TYPE_CODES = {name: i for i, name in enumerate(EVENT_TYPES)}
+_ENUM_CODES = {name: i for i, name in enumerate(ENUMS)}
+_FIELDS = {name: _fields(spec) for name, spec in SCHEMA.items()}
+_KEYS = {name: {"type"} | {f[0] for f in fields} for name, fields in _FIELDS.items()}
+
+
+def _cell(tile):
+    return TERRAIN_CODES[tile["terrain"]] * 2 + (not tile["passable"])
+
+
+def wants_compact(fmt, accept):
+    """True when a request asked for the compact encoding."""
+    if fmt:
+        return fmt == "compact"
+    return MEDIA_TYPE in (accept or "")
+
+
+def dumps(payload):
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class _Units:
+    """Name table shared by encoder and decoder, in first-seen order."""
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def learn(self, chars):
+        for c in chars:
+            if c["name"] not in self.index:
+                self.index[c["name"]] = len(self.names)
+                self.names.append(c["name"])
+
+
+class Encoder:
+    """Stateful encoder for one battle's event stream."""
+
+    def __init__(self, width):
+        self.width = width
+        self.units = _Units()
+
+    def encode(self, ev):
+        kind = ev.get("type")
+        if kind == "map_init":
+            return self._map_init(ev)
+        fields = _FIELDS.get(kind)
+        if fields is None or not _KEYS[kind].issuperset(ev.keys() - TRANSPORT_KEYS):
+            return {k: v for k, v in ev.items() if k not in TRANSPORT_KEYS}
+        if kind == "start":
+            self.units.learn(ev["heroes"])
+            self.units.learn(ev["monsters"])
+        elif kind == "wave_spawn":
+            self.units.learn(ev["monsters"])
+        out = [_TYPE_CODES[kind]]
+        for name, field_kind, _ in fields:
+            value = ev.get(name)
+            out.append(None if value is None else self._value(field_kind, value))
+        while out[-1] is None:
+            out.pop()
+        return out
+
+    def _map_init(self, ev):
+        self.width = ev["width"]
+        cells = "".join(f"{_cell(t):x}" for t in ev["tiles"])
+        return [_TYPE_CODES["map_init"], VERSION, ev["width"], ev["height"], cells]
+
+    def _unit(self, name):
+        return self.units.index.get(name, name)
+
+    def _pos(self, p):
+        return p["y"] * self.width + p["x"]
+
+    def _value(self, kind, value):
+        if kind == "u":
+            return self._unit(value)
+        if kind == "U":
+            return [self._unit(n) for n in value]
+        if kind == "p":
+            return self._pos(value)
+        if kind == "P":
+            return [self._pos(p) for p in value]
+        if kind == "t":
+            return self._pos(value) * 16 + _cell(value)
+        if kind == "e":
+            return _ENUM_CODES.get(value, value)
+        if kind == "b":
+            return int(value)
+        if kind == "c":
+            return [[c["name"], c["hp"], c["max_hp"], c["icon"], self._pos(c)] for c in value]
+        return value
+
+
+class Decoder:
+    """Turns compact events back into the regular event dicts."""
+
+    def __init__(self):
+        self.width = 0
+        self.units = _Units()
+
+    def decode(self, data):
+        if not isinstance(data, list):
+            return data
+        kind = EVENT_TYPES[data[0]]
+        if kind == "map_init":
+            return self._map_init(data)
+        ev = {"type": kind}
+        for i, (name, field_kind, optional) in enumerate(_FIELDS[kind]):
+            value = data[i + 1] if i + 1 < len(data) else None
+            if value is None:
+                if not optional:
+                    ev[name] = None
+                continue
+            ev[name] = self._value(field_kind, value)
+        if kind == "start":
+            self.units.learn(ev["heroes"])
+            self.units.learn(ev["monsters"])
+        elif kind == "wave_spawn":
+            self.units.learn(ev["monsters"])
+        return ev
+
+    def _map_init(self, data):
+        version, width, height, cells = data[1:5]
+        if version != VERSION:
+            raise ValueError(f"unsupported protocol version {version}")
+        self.width = width
+        tiles = []
+        for i, cell in enumerate(cells):
+            tiles.append(self._tile(i, int(cell, 16)))
+        return {"type": "map_init", "width": width, "height": height, "tiles": tiles}
+
+    def _tile(self, i, cell):
+        return {
+            "x": i % self.width,
+            "y": i // self.width,
+            "terrain": TERRAINS[cell >> 1],
+            "passable": not cell & 1,
+        }
+
+    def _unit(self, value):
+        return self.units.names[value] if isinstance(value, int) else value
+
+    def _pos(self, i):
+        return {"x": i % self.width, "y": i // self.width}
+
+    def _value(self, kind, value):
+        if kind == "u":
+            return self._unit(value)
+        if kind == "U":
+            return [self._unit(v) for v in value]
+        if kind == "p":
+            return self._pos(value)
+        if kind == "P":
+            return [self._pos(i) for i in value]
+        if kind == "t":
+            return self._tile(value >> 4, value & 15)
+        if kind == "e":
+            return ENUMS[value] if isinstance(value, int) else value
+        if kind == "b":
+            return bool(value)
+        if kind == "c":
+            chars = []
+            for name, hp, max_hp, icon, pos in value:
+                p = self._pos(pos)
+                chars.append({"name": name, "hp": hp, "max_hp": max_hp, "icon": icon, "x": p["x"], "y": p["y"]})
+            return chars
+        return value
+
+
+def schema():
+    """Everything a client needs to build its own decoder."""
+    return {
+        "version": VERSION,
+        "types": EVENT_TYPES,
+        "enums": ENUMS,
+        "terrains": TERRAINS,
+        "schema": SCHEMA,
+    }
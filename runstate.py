@@ -0,0 +1,156 @@
+"""Battle state rebuilt from a run's event stream.
+
+The engine runs ahead of what a client has seen (a unit's whole turn is
+resolved before its first event is delivered), so snapshots for
+reconnecting clients are folded from the delivered events instead of read
+off the ``Game``. A snapshot taken after event ``seq`` is exactly what a
+client that applied events ``1..seq`` knows.
+"""
+
+
+class RunState:
+    """Map, units, round and objective progress as seen by a client."""
+
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.tiles = []
+        self.arena = None
+        self.round = 0
+        self.order = []
+        self.phase = None
+        self.heroes = {}
+        self.monsters = {}
+        self.objective = None
+        self.winner = None
+
+    def apply(self, ev):
+        handler = _HANDLERS.get(ev["type"])
+        if handler:
+            handler(self, ev)
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "tiles": self.tiles,
+            "arena": self.arena,
+            "round": self.round,
+            "order": self.order,
+            "phase": self.phase,
+            "heroes": list(self.heroes.values()),
+            "monsters": list(self.monsters.values()),
+            "objective": self.objective,
+            "winner": self.winner,
+        }
+
+    def _unit(self, name):
+        return self.heroes.get(name) or self.monsters.get(name)
+
+    def _add_units(self, side, chars):
+        for c in chars:
+            side[c["name"]] = dict(c, statuses={})
+
+    # --- event handlers -------------------------------------------------
+    def _map_init(self, ev):
+        self.width = ev["width"]
+        self.height = ev["height"]
+        self.tiles = [dict(t) for t in ev["tiles"]]
+
+    def _start(self, ev):
+        self.arena = ev["arena"]
+        self.round = 1
+        self._add_units(self.heroes, ev["heroes"])
+        self._add_units(self.monsters, ev["monsters"])
+
+    def _wave_spawn(self, ev):
+        self._add_units(self.monsters, ev["monsters"])
+
+    def _objective_init(self, ev):
+        self.objective = {
+            "mission": ev["mission"],
+            "data": ev["data"],
+            "target": None,
+            "progress": 0,
+            "required": None,
+            "status": "active",
+        }
+
+    def _objective_target(self, ev):
+        self.objective["target"] = ev["id"]
+
+    def _objective_progress(self, ev):
+        self.objective["progress"] = ev["progress"]
+        self.objective["required"] = ev["required"]
+
+    def _objective_complete(self, ev):
+        self.objective["status"] = "complete"
+
+    def _objective_fail(self, ev):
+        self.objective["status"] = "failed"
+
+    def _phase_change(self, ev):
+        self.phase = ev["value"]
+
+    def _round(self, ev):
+        self.round = ev["round"]
+        self.order = list(ev["order"])
+        for unit in (*self.heroes.values(), *self.monsters.values()):
+            unit["statuses"].pop("taunt", None)
+
+    def _move(self, ev):
+        unit = self._unit(ev["unit_id"])
+        unit["x"], unit["y"] = ev["to"]["x"], ev["to"]["y"]
+
+    def _tile(self, ev):
+        tile = ev["tile"]
+        self.tiles[tile["y"] * self.width + tile["x"]] = dict(tile)
+
+    def _hp(self, ev):
+        unit = self._unit(ev.get("target") or ev["actor"])
+        unit["hp"] = ev["hp"]
+
+    def _death(self, ev):
+        self._unit(ev["target"])["hp"] = 0
+
+    def _status(self, ev):
+        unit = self._unit(ev.get("target") or ev.get("actor"))
+        if unit is None or ev["status"] == "fireball":
+            return
+        value = ev.get("turns") or ev.get("remaining") or 1
+        unit["statuses"][ev["status"]] = value
+
+    def _shield(self, ev):
+        statuses = self._unit(ev["target"])["statuses"]
+        if ev["remaining"] > 0:
+            statuses["shield"] = ev["remaining"]
+        else:
+            statuses.pop("shield", None)
+
+    def _end(self, ev):
+        self.winner = ev["winner"]
+
+
+_HANDLERS = {
+    "map_init": RunState._map_init,
+    "start": RunState._start,
+    "wave_spawn": RunState._wave_spawn,
+    "objective_init": RunState._objective_init,
+    "objective_target": RunState._objective_target,
+    "objective_progress": RunState._objective_progress,
+    "objective_complete": RunState._objective_complete,
+    "objective_fail": RunState._objective_fail,
+    "phase_change": RunState._phase_change,
+    "round": RunState._round,
+    "move": RunState._move,
+    "patrol_tick": RunState._move,
+    "enter_tile": RunState._tile,
+    "leave_tile": RunState._tile,
+    "damage": RunState._hp,
+    "heal": RunState._hp,
+    "passive_tick": RunState._hp,
+    "death": RunState._death,
+    "status": RunState._status,
+    "shield": RunState._shield,
+    "end": RunState._end,
+}
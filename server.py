@@ -1,35 +1,87 @@
-from flask import Flask, jsonify, request
-from engine import Game
-import uuid
+import os
+import time
+
+from flask import Flask, Response, g, jsonify, request
+from sessions import SessionRegistry
+import api
+import metrics
+import protocol
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 
-game = None
-current_run_id = None
+sessions = SessionRegistry.from_env()
+
+TIMED_ENDPOINTS = {'start', 'next_event'}
+
+if os.environ.get('METRICS'):
+    metrics.enable()
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    if metrics.enabled() and request.endpoint in TIMED_ENDPOINTS:
+        metrics.registry.observe('request', time.perf_counter() - g.started, request.path)
+    return response
 
 @app.route('/')
 def index():
     return app.send_static_file('index.html')
 
+def respond(compact, payload):
+    if compact:
+        return Response(protocol.dumps(payload), mimetype=protocol.MEDIA_TYPE,
+                        headers={'Vary': 'Accept'})
+    return jsonify(payload)
+
+@app.route('/protocol')
+def protocol_schema():
+    return jsonify(protocol.schema())
+
 @app.route('/start')
 def start():
-    global game, current_run_id
-    game = Game()
-    current_run_id = str(uuid.uuid4())
-    ev = game.next_event()
-    ev['runId'] = current_run_id
-    return jsonify(ev)
+    return respond(*api.start(sessions, request.args.get, request.headers.get))
 
 @app.route('/next')
 def next_event():
-    if not game:
-        return jsonify(None)
-    if request.args.get('runId') != current_run_id:
-        return jsonify(None)
-    ev = game.next_event()
-    if ev:
-        ev['runId'] = current_run_id
-    return jsonify(ev)
+    poll = api.Poll(sessions, request.args.get, request.headers.get)
+    if poll.delay:
+        time.sleep(poll.delay)
+    return respond(*poll.reply())
+
+@app.route('/stream')
+def stream():
+    events = api.Stream(sessions, request.args.get, request.headers.get)
+    if not events.found:
+        return Response(status=204)
+
+    def generate():
+        for chunk in events.chunks():
+            if chunk is None:
+                time.sleep(events.pause)
+            else:
+                yield chunk
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/state')
+def state():
+    return jsonify(api.state(sessions, request.args.get))
+
+@app.route('/skip')
+def skip():
+    return jsonify(api.skip(sessions, request.args.get))
+
+@app.route('/stats')
+def stats():
+    return jsonify(sessions.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(api.metrics_text(sessions), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,314 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+
+import protocol
+from engine import Game
+from runstate import RunState
+from store import SessionStore
+
+HISTORY_SIZE = 512
+# delivered events kept in stored sessions; clients that are further
+# behind after a run moved to another worker resync from /state
+STORED_HISTORY = 64
+
+
+class Session:
+    """A single battle run owned by one client."""
+
+    def __init__(self, run_id, game):
+        self.run_id = run_id
+        self.game = game
+        # serialises access to the game's event generator
+        self.lock = threading.Lock()
+        self.last_access = time.monotonic()
+        # earliest time the client is expected to need the next batch
+        self.ready_at = 0.0
+        self.done = False
+        self._held = None
+        # every delivered event gets a sequence number; the most recent
+        # ones are kept so a reconnecting client can resume
+        self.seq = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        # protocol.Encoder, created on the first compact request
+        self.encoder = None
+        # what a client that saw every delivered event knows
+        self.state = RunState()
+        # changed since it was last written to the registry's store
+        self.dirty = True
+
+    def pull(self, limit=1, until_round=False):
+        """Advance the game by up to ``limit`` events.
+
+        With ``until_round`` the batch also stops right before the next
+        ``round`` event, which is kept back to open the following batch.
+        Must be called with ``lock`` held.
+        """
+        events = []
+        while limit is None or len(events) < limit:
+            if self._held is not None:
+                ev, self._held = self._held, None
+            else:
+                ev = self.game.next_event()
+            if ev is None:
+                self.done = True
+                break
+            if until_round and events and ev["type"] == "round":
+                self._held = ev
+                break
+            self.seq += 1
+            self.history.append((self.seq, ev))
+            self.state.apply(ev)
+            events.append(ev)
+        if events:
+            self.dirty = True
+        return events
+
+    def encode(self, ev):
+        """``ev`` in the compact protocol. Must be called with ``lock`` held."""
+        if self.encoder is None:
+            self.encoder = protocol.Encoder(self.game.map.width)
+            # the run may have started in JSON: units announced so far are
+            # numbered in the order a client finds them in /state
+            self.encoder.units.learn(self.state.heroes.values())
+            self.encoder.units.learn(self.state.monsters.values())
+        return self.encoder.encode(ev)
+
+    def missed(self, after):
+        """True when events following ``after`` can no longer be replayed."""
+        if after > self.seq:
+            # see read(): a run restored from an older snapshot catches up
+            return self.done
+        first = self.history[0][0] if self.history else self.seq + 1
+        return after + 1 < first
+
+    def read(self, after, limit=1, until_round=False):
+        """Return up to ``limit`` ``(seq, event)`` pairs following ``after``.
+
+        Events still in the history are replayed before the game is
+        advanced, so repeating a read is harmless. Callers should check
+        :meth:`missed` first. Must be called with ``lock`` held.
+        """
+        if after > self.seq:
+            # the client got further on another worker; battles are
+            # deterministic, so replaying the gap yields the same events
+            self.pull(after - self.seq)
+        if after < self.seq and self.history:
+            first = self.history[0][0]
+            start = max(after + 1 - first, 0)
+            items = list(islice(self.history, start, start + limit))
+            if until_round:
+                for i, (_, ev) in enumerate(items[1:], 1):
+                    if ev["type"] == "round":
+                        return items[:i]
+            return items
+        events = self.pull(limit, until_round)
+        return list(islice(self.history, len(self.history) - len(events), None))
+
+    def snapshot(self):
+        """Client-visible state after the latest delivered event.
+
+        Must be called with ``lock`` held.
+        """
+        return dict(self.state.to_dict(), seq=self.seq, done=self.done)
+
+    def to_dict(self):
+        """Everything another process needs to continue the run.
+
+        Must be called with ``lock`` held.
+        """
+        start = max(len(self.history) - STORED_HISTORY, 0)
+        return {
+            "run_id": self.run_id,
+            "seq": self.seq,
+            "done": self.done,
+            "held": self._held,
+            "history": list(islice(self.history, start, None)),
+            "state": vars(self.state),
+            "names": self.encoder.units.names if self.encoder else None,
+            "game": self.game.snapshot(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(data["run_id"], Game.from_snapshot(data["game"]))
+        session.seq = data["seq"]
+        session.done = data["done"]
+        session._held = data["held"]
+        session.dirty = False
+        session.history.extend((seq, ev) for seq, ev in data["history"])
+        vars(session.state).update(data["state"])
+        if data["names"] is not None:
+            session.encoder = protocol.Encoder(session.game.map.width)
+            session.encoder.units.learn({"name": name} for name in data["names"])
+        return session
+
+
+class SessionRegistry:
+    """Keeps many concurrent games keyed by run id.
+
+    Memory is capped by evicting the least recently used run once
+    ``max_sessions`` is reached; runs idle for longer than ``ttl`` seconds
+    expire on their next lookup or sweep.
+
+    With a :class:`store.SessionStore` changed runs are written behind
+    every ``flush_interval`` seconds (and when evicted), and runs missing
+    from memory are loaded from the store, so several worker processes
+    sharing one store can all serve every run.
+    """
+
+    def __init__(self, max_sessions=500, ttl=900, clock=time.monotonic,
+                 store=None, flush_interval=1.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self.loaded = 0
+        self.store = store
+        if store is not None:
+            threading.Thread(target=self._write_behind, args=(flush_interval,),
+                             name="session-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls):
+        """Registry configured by ``MAX_SESSIONS``, ``SESSION_TTL`` and
+        ``SESSION_STORE`` (path of a shared SQLite file)."""
+        ttl = float(os.environ.get("SESSION_TTL", 900))
+        path = os.environ.get("SESSION_STORE")
+        return cls(
+            max_sessions=int(os.environ.get("MAX_SESSIONS", 500)),
+            ttl=ttl,
+            store=SessionStore(path, ttl=ttl) if path else None,
+        )
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, game):
+        session = Session(str(uuid.uuid4()), game)
+        with self._lock:
+            evicted = self._insert(session)
+            self.created += 1
+        # written through so that other workers can find it right away
+        self._save(evicted + [session])
+        return session
+
+    def _insert(self, session):
+        now = self.clock()
+        session.last_access = now
+        self._sweep(now)
+        evicted = []
+        while len(self._sessions) >= self.max_sessions:
+            evicted.append(self._sessions.popitem(last=False)[1])
+            self.evicted += 1
+        self._sessions[session.run_id] = session
+        return evicted
+
+    def get(self, run_id):
+        if not run_id:
+            return None
+        now = self.clock()
+        with self._lock:
+            session = self._sessions.get(run_id)
+            if session is not None:
+                if now - session.last_access <= self.ttl:
+                    session.last_access = now
+                    self._sessions.move_to_end(run_id)
+                    return session
+                # idle here, but another worker may have kept the run
+                # going; the store holds its latest copy
+                del self._sessions[run_id]
+                self.expired += 1
+        if self.store is None:
+            return None
+        return self._load(run_id)
+
+    def _load(self, run_id):
+        data = self.store.load(run_id)
+        if data is None:
+            return None
+        try:
+            loaded = Session.from_dict(data)
+        except ValueError:
+            # snapshot from an older release
+            return None
+        with self._lock:
+            # another thread may have loaded it meanwhile
+            session = self._sessions.get(run_id)
+            if session is None:
+                session = loaded
+                evicted = self._insert(session)
+                self.loaded += 1
+            else:
+                evicted = []
+        self._save(evicted)
+        return session
+
+    def remove(self, run_id):
+        if self.store is not None:
+            self.store.delete(run_id)
+        with self._lock:
+            return self._sessions.pop(run_id, None) is not None
+
+    def flush(self):
+        """Write every changed session to the store now."""
+        if self.store is None:
+            return 0
+        with self._lock:
+            dirty = [s for s in self._sessions.values() if s.dirty]
+        return self._save(dirty)
+
+    def _save(self, sessions):
+        if self.store is None:
+            return 0
+        rows = []
+        for session in sessions:
+            with session.lock:
+                if session.dirty:
+                    rows.append((session.run_id, session.seq, self.store.pack(session.to_dict())))
+                    session.dirty = False
+        if rows:
+            self.store.save(rows)
+        return len(rows)
+
+    def _write_behind(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def sweep(self):
+        with self._lock:
+            return self._sweep(self.clock())
+
+    def _sweep(self, now):
+        # sessions are kept in access order so the idle ones sit at the front
+        removed = 0
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_access <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "live": len(self._sessions),
+                "created": self.created,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "loaded": self.loaded,
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,219 @@
+"""Headless Monte Carlo battle simulator.
+
+Runs many ``Game`` instances to completion across worker processes and
+aggregates the outcomes per mission, encounter archetype and tier::
+
+    python simulate.py -n 100000 --tier 1 2 3 --workers 8
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import Game
+
+MISSIONS = ["capture_point", "escort", "survival", "destroy_shrine"]
+Z = 1.96  # 95% confidence
+
+
+def run_battle(tier=1, mission=None, seed=None):
+    """Play one battle and return a compact summary of it."""
+    game = Game(tier, mission, seed)
+    outcome = game.resolve()
+    dealt = {}
+    taken = {}
+    for unit in outcome["units"]:
+        cls = unit["class"]
+        if unit["dealt"]:
+            dealt[cls] = dealt.get(cls, 0) + unit["dealt"]
+        if unit["taken"]:
+            taken[cls] = taken.get(cls, 0) + unit["taken"]
+    if game.objective_complete:
+        objective = "complete"
+    elif game.objective_failed:
+        objective = "failed"
+    else:
+        objective = "elimination"
+    return {
+        "mission": game.mission,
+        "archetype": game.archetype or "-",
+        "tier": tier,
+        "won": outcome["winner"] == "Heroes",
+        "rounds": outcome["rounds"],
+        "dealt": dealt,
+        "taken": taken,
+        "objective": objective,
+    }
+
+
+class _Moments:
+    """Running count, sum and sum of squares for a mean estimate."""
+
+    __slots__ = ("n", "total", "squares")
+
+    def __init__(self, n=0, total=0.0, squares=0.0):
+        self.n = n
+        self.total = total
+        self.squares = squares
+
+    def add(self, value):
+        self.n += 1
+        self.total += value
+        self.squares += value * value
+
+    def merge(self, other):
+        self.n += other.n
+        self.total += other.total
+        self.squares += other.squares
+
+    def interval(self):
+        if not self.n:
+            return 0.0, 0.0, 0.0
+        mean = self.total / self.n
+        var = max(self.squares / self.n - mean * mean, 0.0)
+        half = Z * math.sqrt(var / self.n) if self.n > 1 else 0.0
+        return mean, mean - half, mean + half
+
+
+class Bucket:
+    """Aggregated results for one mission/archetype/tier combination."""
+
+    def __init__(self):
+        self.battles = 0
+        self.wins = 0
+        self.rounds = _Moments()
+        self.dealt = {}
+        self.taken = {}
+        self.objectives = {}
+
+    def add(self, result):
+        self.battles += 1
+        self.wins += result["won"]
+        self.rounds.add(result["rounds"])
+        for field in ("dealt", "taken"):
+            table = getattr(self, field)
+            for cls, amount in result[field].items():
+                table[cls] = table.get(cls, 0) + amount
+        outcome = result["objective"]
+        self.objectives[outcome] = self.objectives.get(outcome, 0) + 1
+
+    def merge(self, other):
+        self.battles += other.battles
+        self.wins += other.wins
+        self.rounds.merge(other.rounds)
+        for field in ("dealt", "taken", "objectives"):
+            table = getattr(self, field)
+            for key, value in getattr(other, field).items():
+                table[key] = table.get(key, 0) + value
+
+    def win_rate(self):
+        """Win rate with a Wilson score interval."""
+        n = self.battles
+        if not n:
+            return 0.0, 0.0, 0.0
+        p = self.wins / n
+        denom = 1 + Z * Z / n
+        centre = (p + Z * Z / (2 * n)) / denom
+        half = Z * math.sqrt(p * (1 - p) / n + Z * Z / (4 * n * n)) / denom
+        return p, max(centre - half, 0.0), min(centre + half, 1.0)
+
+    def to_dict(self):
+        n = self.battles or 1
+        return {
+            "battles": self.battles,
+            "win_rate": self.win_rate(),
+            "rounds": self.rounds.interval(),
+            "damage_dealt": {k: v / n for k, v in sorted(self.dealt.items())},
+            "damage_taken": {k: v / n for k, v in sorted(self.taken.items())},
+            "objectives": {k: v / n for k, v in sorted(self.objectives.items())},
+        }
+
+
+def _run_chunk(args):
+    """Worker entry point: play a slice of battles and aggregate locally."""
+    first, count, tiers, missions, seed = args
+    buckets = {}
+    for i in range(first, first + count):
+        tier = tiers[i % len(tiers)]
+        mission = missions[(i // len(tiers)) % len(missions)] if missions else None
+        # battle i always gets the same seed, whatever the worker layout
+        result = run_battle(tier, mission, seed * 1000003 + i)
+        key = (result["mission"], result["archetype"], result["tier"])
+        buckets.setdefault(key, Bucket()).add(result)
+    return buckets
+
+
+def simulate(n, tiers=(1,), missions=None, workers=None, seed=None, chunk_size=250):
+    """Run ``n`` battles and return ``{(mission, archetype, tier): Bucket}``.
+
+    Battles are spread over ``workers`` processes (all cores by default);
+    ``missions=None`` lets every game pick its mission at random. With a
+    ``seed`` the report is identical for any number of workers.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    tiers = list(tiers)
+    missions = list(missions) if missions else None
+    chunks = [
+        (first, min(chunk_size, n - first), tiers, missions, seed)
+        for first in range(0, n, chunk_size)
+    ]
+    buckets = {}
+    if workers == 1:
+        _merge(buckets, map(_run_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            _merge(buckets, pool.map(_run_chunk, chunks))
+    return buckets
+
+
+def _merge(buckets, parts):
+    for part in parts:
+        for key, bucket in part.items():
+            if key in buckets:
+                buckets[key].merge(bucket)
+            else:
+                buckets[key] = bucket
+
+
+def format_report(buckets):
+    lines = [
+        f"{'mission':<15}{'archetype':<10}{'tier':>4}{'battles':>9}"
+        f"{'win rate (95% CI)':>26}{'rounds (95% CI)':>24}"
+    ]
+    for (mission, archetype, tier), b in sorted(buckets.items()):
+        p, lo, hi = b.win_rate()
+        r, rlo, rhi = b.rounds.interval()
+        lines.append(
+            f"{mission:<15}{archetype:<10}{tier:>4}{b.battles:>9}"
+            f"{p:>10.1%} [{lo:6.1%}, {hi:6.1%}]"
+            f"{r:>8.2f} [{rlo:5.2f}, {rhi:5.2f}]"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--battles", type=int, default=1000)
+    parser.add_argument("--tier", type=int, nargs="+", default=[1])
+    parser.add_argument("--mission", nargs="+", choices=MISSIONS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+    buckets = simulate(args.battles, args.tier, args.mission, args.workers, args.seed)
+    if args.json:
+        report = [
+            dict(mission=m, archetype=a, tier=t, **b.to_dict())
+            for (m, a, t), b in sorted(buckets.items())
+        ]
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(buckets))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,14 @@ let lang = 'ru';
 let strings = {};
 const initEl = document.getElementById('initiative');
 
-let timer = null;
 let speed = 1;
 const characters = {};
 let initiative = [];
 let fireball = null;
 let currentRunId = null;
-let nextAbortController = null;
+let source = null;
+let lastSeq = 0;
+let decode = null; // compact protocol decoder for the current run
 let state = 'idle'; // idle, running, paused, finished
 const playBtn = document.getElementById('play');
 const pauseBtn = document.getElementById('pause');
@@ -56,6 +57,72 @@ function loadLang(l) {
   });
 }
 
+// Compact wire protocol (see protocol.py). The schema is fetched once and
+// a fresh decoder is built for every run.
+const protocolSchema = fetch('/protocol').then(r => r.json()).catch(() => null);
+
+function makeDecoder(p) {
+  let width = 0;
+  const names = [];
+  const known = new Set();
+  const fields = {};
+  for (const [type, spec] of Object.entries(p.schema)) {
+    fields[type] = spec.map(entry => {
+      const optional = entry.endsWith('?');
+      const [name, kind = ''] = entry.replace('?', '').split(':');
+      return { name, kind, optional };
+    });
+  }
+  const learn = chars => chars.forEach(c => {
+    if (!known.has(c.name)) {
+      known.add(c.name);
+      names.push(c.name);
+    }
+  });
+  const unit = v => (typeof v === 'number' ? names[v] : v);
+  const pos = i => ({ x: i % width, y: Math.floor(i / width) });
+  const tile = (i, cell) => ({ ...pos(i), terrain: p.terrains[cell >> 1], passable: !(cell & 1) });
+  const value = (kind, v) => {
+    switch (kind) {
+      case 'u': return unit(v);
+      case 'U': return v.map(unit);
+      case 'p': return pos(v);
+      case 'P': return v.map(pos);
+      case 't': return tile(v >> 4, v & 15);
+      case 'e': return typeof v === 'number' ? p.enums[v] : v;
+      case 'b': return Boolean(v);
+      case 'c': return v.map(([name, hp, max_hp, icon, at]) => ({ name, hp, max_hp, icon, ...pos(at) }));
+      default: return v;
+    }
+  };
+  return data => {
+    if (!Array.isArray(data)) return data;
+    const type = p.types[data[0]];
+    if (type === 'map_init') {
+      const [, version, w, height, cells] = data;
+      if (version !== p.version) throw new Error('unsupported protocol version ' + version);
+      width = w;
+      return { type, width, height, tiles: Array.from(cells, (c, i) => tile(i, parseInt(c, 16))) };
+    }
+    const ev = { type };
+    fields[type].forEach((f, i) => {
+      const v = data[i + 1];
+      if (v === null || v === undefined) {
+        if (!f.optional) ev[f.name] = null;
+      } else {
+        ev[f.name] = value(f.kind, v);
+      }
+    });
+    if (type === 'start') {
+      learn(ev.heroes);
+      learn(ev.monsters);
+    } else if (type === 'wave_spawn') {
+      learn(ev.monsters);
+    }
+    return ev;
+  };
+}
+
 const TILE_SIZE = 64;
 let mapWidth = 0;
 let mapHeight = 0;
@@ -240,6 +307,73 @@ function shiftInitiative(name) {
   }
 }
 
+function initMission(name, data) {
+  mission = name;
+  missionData = {};
+  if (mission === 'capture_point') {
+    missionData.required = data.required;
+    missionData.progress = 0;
+  } else if (mission === 'escort') {
+    missionData.vip = data.vip;
+    const vip = characters[missionData.vip];
+    missionData.max = vip.max_hp;
+    missionData.hp = vip.hp;
+    missionData.done = false;
+  } else if (mission === 'survival') {
+    missionData.required = data.rounds;
+    missionData.progress = 0;
+  } else if (mission === 'destroy_shrine') {
+    missionData.max = data.shrine.hp;
+    missionData.hp = data.shrine.hp;
+  }
+}
+
+// Rebuild the whole view from a /state snapshot (see runstate.py).
+function applySnapshot(snap) {
+  for (const k in characters) delete characters[k];
+  movedActor = null;
+  fireball = null;
+  renderMap(snap.width, snap.height, snap.tiles);
+  setupChars(snap.heroes, snap.monsters);
+  snap.heroes.concat(snap.monsters).forEach(u => {
+    characters[u.name].statuses = { ...u.statuses };
+    updateStatuses(u.name);
+    if (u.hp <= 0) document.getElementById('char-' + u.name)?.remove();
+  });
+  updateBanners();
+  currentRound = snap.round;
+  roundLabel.textContent = t('ui.round', { n: currentRound });
+  initiative = snap.order.filter(n => characters[n] && characters[n].hp > 0);
+  renderInitiative();
+  const o = snap.objective;
+  if (o) {
+    initMission(o.mission, o.data);
+    if (mission === 'destroy_shrine') {
+      if (o.required) missionData.hp = o.required - o.progress;
+    } else if (mission === 'escort') {
+      missionData.done = o.status === 'complete';
+    } else {
+      missionData.progress = o.progress;
+    }
+    if (o.target) document.getElementById('char-' + o.target)?.classList.add('objective');
+    updateMission();
+  }
+  if (snap.winner) handleEvent({ type: 'end', winner: snap.winner });
+}
+
+// The server no longer has the events we missed: reload the full state
+// and continue streaming after it.
+function resync() {
+  closeStream();
+  const runId = currentRunId;
+  fetch('/state?runId=' + encodeURIComponent(runId)).then(r => r.json()).then(snap => {
+    if (!snap || runId !== currentRunId) return;
+    applySnapshot(snap);
+    lastSeq = snap.seq;
+    if (state === 'running') openStream();
+  });
+}
+
 function handleEvent(ev) {
   if (!ev || (ev.runId && ev.runId !== currentRunId)) return;
   const actor = ev.attacker || ev.actor || ev.unit_id;
@@ -262,24 +396,7 @@ function handleEvent(ev) {
       roundLabel.textContent = t('ui.round', { n: currentRound });
       break;
     case 'objective_init':
-      mission = ev.mission;
-      missionData = {};
-      if (mission === 'capture_point') {
-        missionData.required = ev.data.required;
-        missionData.progress = 0;
-      } else if (mission === 'escort') {
-        missionData.vip = ev.data.vip;
-        const vip = characters[missionData.vip];
-        missionData.max = vip.max_hp;
-        missionData.hp = vip.hp;
-        missionData.done = false;
-      } else if (mission === 'survival') {
-        missionData.required = ev.data.rounds;
-        missionData.progress = 0;
-      } else if (mission === 'destroy_shrine') {
-        missionData.max = ev.data.shrine.hp;
-        missionData.hp = ev.data.shrine.hp;
-      }
+      initMission(ev.mission, ev.data);
       updateMission();
       const mtitle = t('mission.title', { name: t(`mission.${mission}.name`) });
       showAbilityBanner(mtitle);
@@ -476,23 +593,38 @@ function handleEvent(ev) {
   }
 }
 
-function fetchNext() {
-  if (!currentRunId || state !== 'running') return;
-  nextAbortController = new AbortController();
-  fetch('/next?runId=' + encodeURIComponent(currentRunId), { signal: nextAbortController.signal })
-    .then(r => r.json())
-    .then(ev => {
-      if (state !== 'running' || !ev || ev.runId !== currentRunId) return;
-      handleEvent(ev);
-    })
-    .catch(() => {});
+function openStream() {
+  closeStream();
+  const runId = currentRunId;
+  let url = '/stream?runId=' + encodeURIComponent(runId) + '&speed=' + speed + '&after=' + lastSeq;
+  if (decode) url += '&format=compact';
+  source = new EventSource(url);
+  source.onmessage = e => {
+    if (runId !== currentRunId || state !== 'running') return;
+    lastSeq = Number(e.lastEventId);
+    const data = JSON.parse(e.data);
+    handleEvent(decode ? decode(data) : data);
+  };
+  source.addEventListener('resync', () => {
+    if (runId === currentRunId) resync();
+  });
+}
+
+function closeStream() {
+  if (source) source.close();
+  source = null;
 }
 
 function start(auto = true) {
-  if (nextAbortController) nextAbortController.abort();
-  fetch('/start').then(r => r.json()).then(ev => {
-    if (!ev) return;
-    currentRunId = ev.runId;
+  closeStream();
+  protocolSchema.then(schema => {
+    decode = schema ? makeDecoder(schema) : null;
+    return fetch(decode ? '/start?format=compact' : '/start');
+  }).then(r => r.json()).then(data => {
+    if (!data) return;
+    const ev = decode ? decode(data.events[0]) : data;
+    currentRunId = data.runId;
+    lastSeq = data.seq;
     logEl.innerHTML = '';
     currentRound = 1;
     roundLabel.textContent = t('ui.round', { n: currentRound });
@@ -523,18 +655,14 @@ function start(auto = true) {
 
 function resume() {
   if (!currentRunId) return;
-  if (timer) clearInterval(timer);
-  timer = setInterval(fetchNext, 1000 / speed);
   state = 'running';
   playBtn.disabled = true;
   pauseBtn.disabled = false;
-  fetchNext();
+  openStream();
 }
 
 function pause() {
-  if (timer) clearInterval(timer);
-  timer = null;
-  if (nextAbortController) nextAbortController.abort();
+  closeStream();
   state = 'paused';
   pauseBtn.disabled = true;
   playBtn.disabled = false;
@@ -542,13 +670,12 @@ function pause() {
 
 function restart() {
   pause();
-  if (nextAbortController) nextAbortController.abort();
   start(false);
 }
 
 function setSpeed(s) {
   speed = Number(s);
-  if (timer) resume();
+  if (state === 'running') openStream();
 }
 function play() {
   if (state === 'idle' || state === 'finished') {
@@ -0,0 +1,92 @@
+"""SQLite store of serialised sessions shared by worker processes.
+
+``SessionRegistry`` writes changed runs here in the background and loads
+runs it does not hold from here, so any of several workers behind one
+load balancer can continue any run::
+
+    SESSION_STORE=/var/tmp/autorpg.sqlite gunicorn -w 4 server:app
+
+Rows hold zlib-compressed JSON of ``Session.to_dict()``. A write never
+replaces a row with a lower ``seq``: workers that advanced the same run
+produced the same events, as battles are deterministic, so the furthest
+copy wins. A worker that loaded an older copy catches up when a client
+asks for events after its ``seq``; plain ``/next`` calls without
+``after`` cannot tell it is behind and may deliver events again.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated);
+"""
+
+UPSERT = """
+INSERT INTO runs (run_id, seq, updated, data) VALUES (?, ?, ?, ?)
+ON CONFLICT (run_id) DO UPDATE
+SET seq = excluded.seq, updated = excluded.updated, data = excluded.data
+WHERE excluded.seq >= runs.seq
+"""
+
+
+class SessionStore:
+    """Runs keyed by id in one SQLite file; rows idle for ``ttl`` seconds
+    are dropped on the next write."""
+
+    def __init__(self, path, ttl=900, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        # wall clock: the timestamps are compared across processes
+        self.clock = clock
+        self._local = threading.local()
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        # sqlite3 connections must stay in the thread that opened them
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def pack(data):
+        return zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 1)
+
+    @staticmethod
+    def unpack(blob):
+        return json.loads(zlib.decompress(blob))
+
+    def save(self, rows):
+        """Write ``(run_id, seq, packed)`` rows in one transaction."""
+        now = self.clock()
+        db = self._db()
+        with db:
+            db.executemany(UPSERT, [(run_id, seq, now, blob) for run_id, seq, blob in rows])
+            db.execute("DELETE FROM runs WHERE updated < ?", (now - self.ttl,))
+
+    def load(self, run_id):
+        row = self._db().execute(
+            "SELECT data, updated FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None or self.clock() - row[1] > self.ttl:
+            return None
+        return self.unpack(row[0])
+
+    def delete(self, run_id):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
@@ -0,0 +1,60 @@
+"""Shared endpoint logic, driven without a web server."""
+
+import pytest
+
+import api
+from sessions import SessionRegistry
+
+
+def accessor(values):
+    def get(name, default=None, type=str):
+        value = values.get(name)
+        if value is None:
+            return default
+        try:
+            return type(value)
+        except ValueError:
+            return default
+    return get
+
+
+def call(handler, sessions, headers=None, **args):
+    return handler(sessions, accessor(args), accessor(headers or {}))
+
+
+@pytest.fixture
+def sessions():
+    return SessionRegistry()
+
+
+def test_replayed_events_carry_no_run_id(sessions):
+    _, first = call(api.start, sessions, seed="4")
+    run_id = first["runId"]
+    for _ in range(3):
+        call(api.Poll, sessions, runId=run_id).reply()
+    _, payload = call(api.Poll, sessions, runId=run_id, after="0", batch="10").reply()
+    assert [ev["type"] for ev in payload["events"]][:2] == ["map_init", "start"]
+    assert not any("runId" in ev for ev in payload["events"])
+
+
+def test_compact_after_json_start_uses_name_indexes(sessions):
+    _, first = call(api.start, sessions, seed="4")
+    compact, payload = call(api.Poll, sessions, runId=first["runId"], batch="40", format="compact").reply()
+    assert compact
+    # unit fields are table indexes; only unknown names would be strings
+    for ev in payload["events"]:
+        assert not any(isinstance(v, str) for v in ev[1:])
+
+
+def test_unknown_runs(sessions):
+    assert call(api.Poll, sessions, runId="nope", batch="3").reply() == (False, None)
+    assert not call(api.Stream, sessions, runId="nope").found
+    assert api.state(sessions, accessor({})) is None
+
+
+def test_stream_resumes_after_last_event_id(sessions):
+    _, first = call(api.start, sessions, seed="2")
+    stream = call(api.Stream, sessions, {"Last-Event-ID": "1"}, runId=first["runId"])
+    chunks = [c for c in stream.chunks() if c is not None]
+    assert chunks[0].startswith("id: 2\n")
+    assert chunks[-1].startswith(f"id: {sessions.get(first['runId']).seq}\n")
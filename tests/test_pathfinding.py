@@ -0,0 +1,29 @@
+"""Distance-field paths agree with the reference BFS while battles play out."""
+
+import pytest
+
+from engine import Game
+
+# deaths are checked on the next event, once the step has handled them
+CHECK_AFTER = {"enter_tile", "attack", "round", "wave_spawn"}
+
+
+def check_paths(game):
+    living = game.units.living()
+    goals = [(u.x, u.y) for u in living] + [(game.map.width - 1, game.map.height - 1)]
+    for unit in living:
+        start = (unit.x, unit.y)
+        for goal in goals:
+            expected = game.find_path_bfs(start, goal, mover=unit)
+            assert game.find_path(start, goal, mover=unit) == expected, (start, goal)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_find_path_matches_bfs_on_generated_maps(seed):
+    game = Game(seed=seed, map_size=(20, 20))
+    checked = 0
+    while (ev := game.next_event()) is not None:
+        if ev["type"] in CHECK_AFTER:
+            check_paths(game)
+            checked += 1
+    assert checked
@@ -0,0 +1,27 @@
+"""Units report deaths and revivals to their game's UnitRegistry."""
+
+import gc
+
+from engine import HEROES, Game
+
+
+def test_counts_follow_deaths_and_revivals():
+    game = Game(seed=1)
+    hero = game.heroes[0]
+    alive = game.units.alive[HEROES]
+    hero.take_damage(1000)
+    assert game.units.alive[HEROES] == alive - 1
+    assert hero not in game.units.living(HEROES)
+    hero._restore(3)
+    assert game.units.alive[HEROES] == alive
+    assert hero in game.units.living(HEROES)
+
+
+def test_units_outlive_their_game():
+    hero = Game(seed=1).heroes[0]
+    gc.collect()
+    assert hero._registry() is None
+    hero.take_damage(1000)
+    assert hero.hp == 0
+    hero._restore(5)
+    assert hero.hp == 5
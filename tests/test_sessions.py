@@ -0,0 +1,73 @@
+"""SessionRegistry expiry, eviction and the shared store, on a fake clock."""
+
+from engine import Game
+from sessions import SessionRegistry
+from store import SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_expired_local_copy_falls_back_to_store(tmp_path):
+    clock = Clock()
+    store = SessionStore(str(tmp_path / "runs.sqlite"), ttl=60, clock=clock)
+    first = SessionRegistry(ttl=60, clock=clock, store=store, flush_interval=3600)
+    second = SessionRegistry(ttl=60, clock=clock, store=store, flush_interval=3600)
+    run_id = first.create(Game(seed=3)).run_id
+    # the client moves to the second worker and keeps playing there
+    for _ in range(4):
+        clock.now += 30
+        session = second.get(run_id)
+        with session.lock:
+            session.pull(5)
+    assert second.flush() == 1
+    session = first.get(run_id)
+    assert session is not None
+    assert session.seq == 20
+    assert first.stats()["expired"] == 1
+    assert first.stats()["loaded"] == 1
+
+
+def test_least_recently_used_run_is_evicted():
+    registry = SessionRegistry(max_sessions=2, ttl=60, clock=Clock())
+    first = registry.create(Game(seed=1)).run_id
+    second = registry.create(Game(seed=2)).run_id
+    registry.get(first)
+    third = registry.create(Game(seed=3)).run_id
+    assert registry.get(second) is None
+    assert registry.get(first) is not None
+    assert registry.get(third) is not None
+    assert registry.stats()["evicted"] == 1
+    assert registry.stats()["expired"] == 0
+    assert len(registry) == 2
+
+
+def test_idle_runs_expire():
+    clock = Clock()
+    registry = SessionRegistry(max_sessions=2, ttl=60, clock=clock)
+    idle = registry.create(Game(seed=1)).run_id
+    clock.now += 40
+    busy = registry.create(Game(seed=2)).run_id
+    clock.now += 40
+    assert registry.get(idle) is None
+    assert registry.get(busy) is not None
+    clock.now += 61
+    assert registry.sweep() == 1
+    stats = registry.stats()
+    assert (stats["live"], stats["expired"], stats["evicted"]) == (0, 2, 0)
+
+
+def test_expired_runs_free_room_before_eviction():
+    clock = Clock()
+    registry = SessionRegistry(max_sessions=2, ttl=60, clock=clock)
+    registry.create(Game(seed=1))
+    registry.create(Game(seed=2))
+    clock.now += 61
+    registry.create(Game(seed=3))
+    stats = registry.stats()
+    assert (stats["live"], stats["expired"], stats["evicted"]) == (1, 2, 0)
@@ -0,0 +1,27 @@
+"""A game restored from a JSON snapshot continues with the same events."""
+
+import json
+import random
+
+import pytest
+
+from engine import Game
+
+
+def rest(game):
+    return list(game._events())
+
+
+@pytest.mark.parametrize("seed", range(16))
+def test_snapshot_round_trip_continues_identically(seed):
+    options = {"map_size": (20, 20)} if seed % 4 == 0 else {}
+    reference = Game(seed=seed, **options)
+    expected = rest(reference)
+    cuts = random.Random(seed).sample(range(len(expected)), 3)
+    for cut in sorted(cuts) + [0, len(expected)]:
+        game = Game(seed=seed, **options)
+        for _ in range(cut):
+            game.next_event()
+        restored = Game.from_snapshot(json.loads(json.dumps(game.snapshot())))
+        assert rest(restored) == expected[cut:]
+        assert restored.result() == reference.result()
@@ -0,0 +1,49 @@
+"""Unit templates and encounter tables loaded from units.json."""
+
+import json
+
+import pytest
+
+import engine
+from engine import UNITS_FILE, Game, load_units
+
+
+@pytest.fixture
+def unit_file(tmp_path):
+    with open(UNITS_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    path = tmp_path / "units.json"
+
+    def write(change):
+        change(data)
+        path.write_text(json.dumps(data), encoding="utf-8")
+        return str(path)
+
+    return write
+
+
+def test_templates_supply_every_stat(unit_file, monkeypatch):
+    def change(data):
+        data["units"]["EnemyShrine"]["hp"] = 50
+        data["units"]["Troll"]["hp"] = 77
+    units = load_units(unit_file(change))
+    monkeypatch.setattr(engine, "UNIT_TEMPLATES", units.templates)
+    game = Game(seed=1, mission="destroy_shrine")
+    assert (game.shrine.hp, game.shrine.max_hp) == (50, 50)
+    assert engine.Troll().max_hp == 77
+
+
+def test_weighted_encounters_expand_once(unit_file):
+    units = load_units(unit_file(lambda data: data["encounters"]["swarm"].update(weight=3)))
+    names = [e.name for e in units.encounters]
+    assert names.count("swarm") == 3 and len(names) == 5
+
+
+@pytest.mark.parametrize("change", [
+    lambda data: data["units"]["Goblin"].update({"class": "Dragon"}),
+    lambda data: data["encounters"]["swarm"]["units"].append("Dragon"),
+    lambda data: data["encounters"]["elite"]["units"][0]["pick"].update(Orc=0.5),
+])
+def test_bad_files_raise_value_error(unit_file, change):
+    with pytest.raises(ValueError):
+        load_units(unit_file(change))